@@ -1,36 +1,84 @@
 import sqlite3
 import datetime
+import calendar
 import openpyxl
 from openpyxl.styles import Font, Border, Side, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
 import os
 import subprocess
 import json
+import functools
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+
+import punch_cache
+import report_cache
+import report_formats
+import report_timing
+import timenet_db
 
 # ===============================================================
-# TIME CONSTANTS
+# SHIFT DEFINITIONS
 # ===============================================================
-am_start = datetime.time(7, 30, 0)  # 7:30 am start time
-am_late = datetime.time(9, 30, 0)  # 9:30 am late start
-am_absent = datetime.time(10, 0, 0)  # 10:15 am absent
-am_end = datetime.time(14, 0, 0)  # 2:00 pm out time
-am_latest_out = datetime.time(15, 0, 0)  # 3:00 pm latest out
-
-pm_start = datetime.time(15, 1, 0)  # 3:01 pm start time
-pm_late = datetime.time(16, 0, 0)  # 4:00 pm late start
-pm_absent = datetime.time(16, 31, 0)  # 4:30 pm absent
-pm_end = datetime.time(21, 0, 0)  # 9:00 pm out time
-pm_latest_out = datetime.time(23, 59, 0)  # 11:59 pm latest out
+
+# Shifts used when config.json has no "shifts" list, in HH:MM. A time earlier than the one before it
+# falls on the next day, so a shift may run past midnight. See compile_shifts.
+default_shifts = [
+    {
+        "name": "AM",
+        "start": "07:30",  # 7:30 am start time
+        "late": "09:30",  # 9:30 am late start
+        "absent": "10:00",  # 10:00 am absent
+        "end": "14:00",  # 2:00 pm out time
+        "latest_out": "15:00"  # 3:00 pm latest out
+    },
+    {
+        "name": "PM",
+        "start": "15:01",  # 3:01 pm start time
+        "late": "16:00",  # 4:00 pm late start
+        "absent": "16:31",  # 4:31 pm absent
+        "end": "21:00",  # 9:00 pm out time
+        "latest_out": "23:59"  # 11:59 pm latest out
+    }
+]
 
 config_file = "config.json"
 
+# Number of punch rows pulled from the database per fetchmany call
+fetch_batch_size = 5000
+
+
 
 # ===============================================================
 # CONFIGURATION MANAGEMENT
 # ===============================================================
 
-# Load configuration from file or return defaults
-def load_config():
+# Parsed config.json and the tables derived from it, reused until the file changes. "state" is
+# replaced in one assignment, so threads never see a new config alongside old shift rules.
+_config_cache = {"state": None}
+
+# Rates used for employees whose department has no configured salary
+unknown_department_rates = {
+    "daily_salary": 0.0,
+    "deduction_per_minute": 0.0,
+    "absence_deduction": 0.0
+}
+
+
+# Return a (mtime, size) signature for the config file, or None if it is missing
+def _config_signature():
+    try:
+        stat = os.stat(config_file)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# Read configuration from file or return defaults
+def _read_config():
     try:
         with open(config_file, "r") as f:
             return json.load(f)
@@ -38,6 +86,19 @@ def load_config():
         return {
             "db_path": "C:/Program Files (x86)/ZKBio Time.Net/TimeNet.db",
             "report_directory": "C:/Users/Public/Documents",
+            "engine": "python",
+            "excel_write_only": True,
+            "use_punch_cache": False,
+            "workers": 1,
+            "per_department_workbooks": False,
+            "report_writer": "openpyxl",
+            "query_mode": "raw",
+            "reuse_reports": True,
+            "branches": [],
+            "per_branch_sheets": False,
+            "shifts": default_shifts,
+            "timing_log": report_timing.default_timing_log,
+            "trace_memory": False,
             "department_salaries": {
                 "Dining 1": 12750.0,
                 "Dining 2": 12300.0,
@@ -55,107 +116,550 @@ def load_config():
         }
 
 
+# Calculate all rates from a monthly salary using the same formula for all departments
+def _compute_rates(base_salary, num_shifts=2):
+    """absence_deduction is charged per missed shift, so a day of absences costs one daily salary"""
+    return {
+        "daily_salary": base_salary / 30,
+        "deduction_per_minute": ((base_salary / 30) / 8) / 60,
+        "absence_deduction": (base_salary / 30) / num_shifts
+    }
+
+
+# The rates of _compute_rates as exact Decimals, for payroll amounts
+def _compute_payroll_rates(base_salary, num_shifts=2):
+    daily_salary = Decimal(str(base_salary)) / 30
+    return {
+        "daily_salary": daily_salary,
+        "deduction_per_minute": daily_salary / 8 / 60,
+        "absence_deduction": daily_salary / num_shifts
+    }
+
+
+# Load configuration, re-reading config.json only when its mtime or size changes
+def load_config():
+    """Return the cached configuration; callers must treat it as read-only"""
+    return _config_state()["config"]
+
+
+# The cached config with its signature, shift rules and rate tables, see load_config
+def _config_state():
+    """
+    Everything is built before anything is cached, so an invalid config.json raises the same
+    ValueError on every call until the file is fixed
+    """
+    signature = _config_signature()
+    state = _config_cache["state"]
+    if state is None or signature != state["signature"]:
+        config = _read_config()
+        shift_rules = compile_shifts(config.get("shifts") or default_shifts)
+        num_shifts = len(shift_rules[1])
+        state = {
+            "signature": signature,
+            "config": config,
+            "shift_rules": shift_rules,
+            "salary_table": {
+                dept_name: _compute_rates(base_salary, num_shifts)
+                for dept_name, base_salary in config["department_salaries"].items()
+            },
+            "payroll_rates": {
+                dept_name: _compute_payroll_rates(base_salary, num_shifts)
+                for dept_name, base_salary in config["department_salaries"].items()
+            },
+        }
+        _config_cache["state"] = state
+    return state
+
+
+# Get the precomputed per-department rate table
+def get_salary_table():
+    """Return {dept_name: {"daily_salary", "deduction_per_minute", "absence_deduction"}}"""
+    return _config_state()["salary_table"]
+
+
+# Get the per-department rates as Decimals, see compute_payroll
+def get_payroll_rates():
+    return _config_state()["payroll_rates"]
+
+
 # Get salary configuration for a specific department
 def get_salary_config(dept_name):
-    """Return salary configuration based on department role"""
-    config = load_config()
+    """Return salary configuration based on department role, or None if the department is not configured"""
+    return get_salary_table().get(dept_name)
 
-    # Check if department exists in config
-    if dept_name not in config["department_salaries"]:
-        return None
 
-    # Get department salary
-    base_salary = config["department_salaries"].get(dept_name, 0)
+# ===============================================================
+# PUNCH QUERY
+# ===============================================================
 
-    # Calculate all values from base salary using the same formula for all departments
-    return {
-        "daily_salary": base_salary / 30,
-        "deduction_per_minute": ((base_salary / 30) / 8) / 60,
-        "absence_deduction": (base_salary / 30) / 2
-    }
+# Half-open timestamp range on the raw column so SQLite can use an (employee_id, punch_time) index.
+# Punch times come back as integer seconds from midnight of the start date, so no per-row string
+# parsing happens in Python.
+punch_query = """
+    SELECT em.id, em.emp_firstname, em.emp_lastname, em.department_id, dep.dept_name,
+           strftime('%s', ap.punch_time) - ? AS punch_offset
+    FROM hr_employee em
+    INNER JOIN hr_department dep ON em.department_id = dep.id
+    LEFT JOIN att_punches ap ON em.id = ap.employee_id
+    WHERE (ap.punch_time >= ? AND ap.punch_time < ?) AND (em.emp_privilege=0) AND (em.emp_active=1)
+    ORDER BY em.id, ap.punch_time;
+"""
+
+
+# Same columns as punch_query, reduced in SQLite to the punches classify_shift looks at: the first in
+# (or late) punch and the first out punch of each employee, shift day and shift. Punches outside every
+# in and out window keep one row per employee and day, so such employees still get a record.
+# The {range_index} and {day_adjust} CASE expressions come from first_punch_query.
+first_punch_query_template = """
+    WITH punches AS {materialized} (
+        SELECT ap.employee_id, strftime('%s', ap.punch_time) - ? AS punch_offset
+        FROM hr_employee em
+        INNER JOIN att_punches ap ON em.id = ap.employee_id
+        WHERE (ap.punch_time >= ? AND ap.punch_time < ?) AND (em.emp_privilege=0) AND (em.emp_active=1)
+    ),
+    minutes AS {materialized} (
+        SELECT employee_id, punch_offset, (punch_offset % 86400) / 60 AS minute FROM punches
+    ),
+    first_punches AS (
+        SELECT employee_id, MIN(punch_offset) AS punch_offset
+        FROM minutes
+        GROUP BY employee_id, punch_offset / 86400 + {day_adjust}, {range_index}
+    )
+    SELECT em.id, em.emp_firstname, em.emp_lastname, em.department_id, dep.dept_name, fp.punch_offset
+    FROM first_punches fp
+    INNER JOIN hr_employee em ON em.id = fp.employee_id
+    INNER JOIN hr_department dep ON em.department_id = dep.id
+    ORDER BY em.id, fp.punch_offset;
+"""
+
+# TEMP table that snapshot_query copies the report rows into when the database uses a rollback journal
+snapshot_table = "report_punch_rows"
+
+# "raw" reads every punch with punch_query; "first_punches" lets SQLite aggregate with first_punch_query
+query_modes = ("raw", "first_punches")
+
+
+# Build first_punch_query_template for the configured shifts
+def first_punch_query():
+    """
+    Each minute range of shift_table_ranges becomes one CASE branch. The ranges are integers from
+    compile_shifts, so they are written into the query text rather than bound as parameters.
+    MATERIALIZED (SQLite 3.35+) keeps strftime from running again for every branch.
+    """
+    ranges = shift_table_ranges(shift_rules()[2])
+    range_index = " ".join(f"WHEN minute BETWEEN {first} AND {last} THEN {i}"
+                           for i, (first, last, _, _, _) in enumerate(ranges))
+    day_adjust = " ".join(f"WHEN minute BETWEEN {first} AND {last} THEN {adjust}"
+                          for first, last, _, _, adjust in ranges if adjust)
+    return first_punch_query_template.format(
+        materialized="MATERIALIZED" if sqlite3.sqlite_version_info >= (3, 35) else "",
+        range_index=f"CASE {range_index} END" if ranges else "NULL",
+        day_adjust=f"CASE {day_adjust} ELSE 0 END" if day_adjust else "0")
+
+
+# Build the start epoch and [start_date, end_date + 1 day) bounds for punch_query
+def punch_query_params(start_date, end_date):
+    """
+    When a shift runs past midnight, the end bound moves out by shift_spill_seconds, so only the
+    part of the next day that belongs to end_date's shifts is read
+    """
+    start_epoch = calendar.timegm(datetime.datetime.strptime(start_date, "%Y-%m-%d").timetuple())
+    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d") + datetime.timedelta(days=1,
+                                                                                   seconds=shift_spill_seconds())
+    return start_epoch, start_date, end_dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Open the database the report query runs against
+def connect_punch_source(config, db_path):
+    """
+    The ZKBio database is always opened read-only, retrying while it is locked. With
+    "use_punch_cache" enabled, punches come from the local cache (synced with only the rows
+    added since the last run) and employees from the attached ZKBio database.
+    """
+    if config.get("use_punch_cache"):
+        cache_path = punch_cache.cache_path_for(config, config_file)
+        return closing(timenet_db.with_lock_retry(lambda: punch_cache.connect_cached(db_path, cache_path)))
+    return closing(timenet_db.with_lock_retry(lambda: timenet_db.connect_readonly(db_path)))
+
+
+# Run the punch query and return its rows grouped by employee, as iter_employee_punches does
+def query_employee_punches(conn, start_date, end_date, query_mode="raw"):
+    """
+    query_mode is one of query_modes. Both give the same attendance; "first_punches" returns only
+    a few punches per employee-day, so repeated taps are never sent to Python.
+    The query is a single statement, so it reads one consistent snapshot of the database.
+    In WAL mode the rows are streamed, since readers never block the ZKBio service writing punches.
+    With a rollback journal the reader's shared lock would hold off the writer until the last row
+    is read, so the rows are first copied into a temp table, see snapshot_query.
+    """
+    schemas = [row[1] for row in conn.execute("PRAGMA database_list")]
+    source_schema = "source" if "source" in schemas else "main"
+
+    params = punch_query_params(start_date, end_date)
+    if query_mode == "first_punches":
+        query = first_punch_query()
+    elif query_mode == "raw":
+        query = punch_query
+    else:
+        raise ValueError(f"Unknown query mode: {query_mode}")
+
+    if timenet_db.is_wal(conn, source_schema):
+        return iter_employee_punches(timenet_db.with_lock_retry(lambda: conn.execute(query, params)))
+    return iter_employee_punches(snapshot_query(conn, query, params))
+
+
+# Copy the rows of a query into a TEMP table and return a cursor over them in query order
+def snapshot_query(conn, query, params):
+    """
+    CREATE TABLE ... AS SELECT reads the source in one statement, and its shared lock is released
+    as soon as that statement ends. The rows then wait in SQLite's in-memory temp store (see
+    timenet_db.connection_pragmas), packed far tighter than Python row tuples, and are streamed from
+    there, so memory stays bounded as when streaming in WAL mode.
+    """
+    # The source is opened with mode=ro, so lifting query_only only lets the TEMP table be written
+    query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+    conn.execute("PRAGMA query_only = 0")
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS temp.{snapshot_table}")
+        create = f"CREATE TEMP TABLE {snapshot_table} AS {query.strip().rstrip(';')}"
+        timenet_db.with_lock_retry(lambda: conn.execute(create, params))
+    finally:
+        conn.execute(f"PRAGMA query_only = {query_only}")
+    return conn.execute(f"SELECT * FROM temp.{snapshot_table} ORDER BY rowid")
+
+
+# Group streamed punch rows by employee without holding the whole result set
+def iter_employee_punches(cursor, batch_size=None):
+    """
+    Yield (employee_row, punches) once per employee from an executed punch_query cursor
+    where employee_row is (emp_id, first_name, last_name, department_id, dept_name)
+    and punches is the employee's array('i') of seconds from midnight of the start date.
+    Relies on the query being ordered by employee id.
+    """
+    batch_size = batch_size or fetch_batch_size
+    return group_employee_punches(iter(lambda: cursor.fetchmany(batch_size), []))
+
+
+# Group batches of punch_query rows by employee, see iter_employee_punches
+def group_employee_punches(batches):
+    current_row = None
+    punches = array('i')
+    for rows in batches:
+        for row in rows:
+            if current_row is None or row[0] != current_row[0]:
+                if current_row is not None:
+                    yield current_row, punches
+                current_row = row[:5]
+                punches = array('i')
+            punches.append(row[5])
+
+    if current_row is not None:
+        yield current_row, punches
 
 
 # ===============================================================
 # MAIN PROCESSING FUNCTION
 # ===============================================================
 
-# Process attendance data for a date range and generate Excel report
-def process_dates(start_date, end_date, excel_filename):
+# Stages reported to the progress callback of generate_report, in order
+report_stages = ("query", "classify", "write", "save")
+
+
+# Raised inside generate_report when its cancel event is set
+class ReportCancelled(Exception):
+    pass
+
+
+# Stop the current report if cancellation was requested
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ReportCancelled("Report generation was cancelled")
+
+
+# One employee's row of the report
+class EmployeeRecord:
+    """
+    punches is an array('i') of seconds from midnight of the report's start date until the
+    record is classified; daily then holds [[status per shift], ...] per day and punches is emptied.
+    branch is the name of the branch database the employee was read from, None for a single database.
+    __slots__ keeps each record to a fixed set of fields without a per-instance dict.
+    """
+    __slots__ = ("emp_id", "branch", "first_name", "last_name", "department_id", "dept_name", "daily_salary",
+                 "total_shifts", "late", "absent", "gross_salary", "late_deduction", "absence_deduction", "net_pay",
+                 "punches", "daily")
+
+    def __init__(self, emp_id, first_name, last_name, department_id, dept_name, daily_salary, total_shifts,
+                 punches):
+        self.emp_id = emp_id
+        self.branch = None
+        self.first_name = first_name
+        self.last_name = last_name
+        self.department_id = department_id
+        self.dept_name = dept_name
+        self.daily_salary = daily_salary
+        self.total_shifts = total_shifts
+        self.late = 0
+        self.absent = 0
+        self.gross_salary = 0.0
+        self.late_deduction = 0.0
+        self.absence_deduction = 0.0
+        self.net_pay = 0.0
+        self.punches = punches
+        self.daily = None
+
+
+# Build an unclassified employee record from a grouped punch_query row
+def employee_record(employee_row, punches, num_days, salary_table, unknown_departments):
+    """
+    Departments without a configured salary get zero rates; each is reported once per
+    unknown_departments set.
+    Returns: an EmployeeRecord; its pay columns are filled in by compute_payroll
+    """
+    emp_id, first_name, last_name, department_id, dept_name = employee_row
+
+    # Get salary configuration based on department
+    salary_config = salary_table.get(dept_name)
+    if salary_config is None:
+        if dept_name not in unknown_departments:
+            unknown_departments.add(dept_name)
+            print(f"No salary configured for department '{dept_name}', using 0.00")
+        salary_config = unknown_department_rates
+    daily_salary = salary_config["daily_salary"]
+
+    return EmployeeRecord(emp_id, first_name, last_name, department_id, dept_name, daily_salary,
+                          num_days * len(shift_windows()), punches)
+
+
+# Query and classify attendance for every employee in the date range
+def load_employee_attendance(config, start_date, end_date, engine=None, progress=None, cancel_event=None,
+                             executor=None, timer=None):
+    """
+    Returns: {emp_id: employee record} with "late", "absent", "daily" and the payroll amounts filled in
+    progress, if given, is called with the stage name from report_stages as each stage starts.
+    With a process pool executor, groups of employees are classified in worker processes.
+    timer, a report_timing.ReportTimer, gets the time spent fetching rows as its "fetch" stage.
+    """
+    timer = timer or report_timing.ReportTimer()
+    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
+
+    num_days = (end_dt - start_dt).days + 1
+
+    # Connect to database and stream punch data one employee at a time
+    with connect_punch_source(config, config["db_path"]) as conn:
+        if progress:
+            progress("query")
+        employee_punches = query_employee_punches(conn, start_date, end_date, config.get("query_mode", "raw"))
+
+        # The python engine classifies each employee as soon as their rows are complete;
+        # the numpy engine and worker processes get groups of employees totalling about one fetch batch of punches
+        engine = engine or config.get("engine", "python")
+        classify_batch_punches = fetch_batch_size if engine == "numpy" or executor else 0
+        shards = []
+
+        if progress:
+            progress("classify")
+
+        # Initialize employee attendance dictionary
+        salary_table = get_salary_table()
+        unknown_departments = set()
+        employee_attendance = {}
+        pending = {}
+        pending_punches = 0
+        for employee_row, punches in timer.timed_iter(employee_punches, "fetch"):
+            check_cancelled(cancel_event)
+            emp_id = employee_row[0]
+            timer.count("fetch", len(punches))
+            # Employees who only punched after end_date, in the part of the next day that was read
+            if not has_range_punches(punches, num_days):
+                continue
+            employee_attendance[emp_id] = employee_record(employee_row, punches, num_days, salary_table,
+                                                          unknown_departments)
+
+            # Process attendance once enough employees are complete
+            pending[emp_id] = employee_attendance[emp_id]
+            pending_punches += len(punches)
+            if pending_punches >= classify_batch_punches:
+                if executor:
+                    shards.append(submit_shard(executor, pending, start_date, end_date, engine))
+                else:
+                    classify_and_release(pending, start_date, end_date, engine)
+                pending = {}
+                pending_punches = 0
+
+        if executor and pending:
+            shards.append(submit_shard(executor, pending, start_date, end_date, engine))
+        else:
+            classify_and_release(pending, start_date, end_date, engine)
+
+        # Collect worker results in submission order
+        for shard_records, future in shards:
+            check_cancelled(cancel_event)
+            apply_statuses(shard_records, future.result())
+
+    timer.count("classify", len(employee_attendance))
+
+    with timer.section("payroll"):
+        compute_payroll(employee_attendance, num_days)
+    timer.count("payroll", len(employee_attendance))
+    return employee_attendance
+
+
+# Generate the Excel report for a date range, raising on failure
+def generate_report(start_date, end_date, excel_filename, engine=None, progress=None, cancel_event=None,
+                    writer=None, timer=None, profile_path=None, prefetched=None):
+    """
+    Runs every stage in report_stages. writer picks one of report_writers for this run.
+    cancel_event is a threading.Event checked between employees and rows; when set,
+    ReportCancelled is raised and no file is written.
+    Stage timings go to timer (a new report_timing.ReportTimer if not given) and are appended to the
+    "timing_log" file; with profile_path, the run is profiled with cProfile and the stats saved there.
+    With "reuse_reports" (on unless set to false), a report whose inputs have not changed since it
+    was last written is served again without running any stage, see reuse_report.
+    prefetched, if given, has the "fingerprint" (writer None) and classified "employee_attendance" of a
+    range loaded ahead of time; when the fingerprint still matches, only the write stages run.
+    Returns: the full path of the saved report
+    """
+    # Load configuration
+    config = load_config()
+    engine = engine or config.get("engine", "python")
+    writer = writer or config.get("report_writer", "openpyxl")
+    timer = timer or report_timing.ReportTimer(config.get("trace_memory", False))
+    status = "error"
+    employee_count = 0
+    employee_attendance = None
+
+    timer.begin()
     try:
-        # Load configuration
-        config = load_config()
-        db_path = config["db_path"]
-        report_directory = config["report_directory"]
-
-        start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
-        end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
-
-        num_days = (end_dt - start_dt).days + 1
-        total_shifts = num_days * 2
-
-        # Connect to database and retrieve punch data
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT em.id, em.emp_firstname, em.emp_lastname, em.department_id, dep.dept_name, ap.punch_time
-                FROM hr_employee em
-                INNER JOIN hr_department dep ON em.department_id = dep.id
-                LEFT JOIN att_punches ap ON em.id = ap.employee_id
-                WHERE (date(ap.punch_time) BETWEEN ? AND ?) AND (em.emp_privilege=0) AND (em.emp_active=1)
-                ORDER BY em.id, ap.punch_time;
-            """
-            cursor.execute(query, (start_date, end_date))
-            results = cursor.fetchall()
-
-            # Initialize employee attendance dictionary
-            employee_attendance = {}
-            for emp_id, first_name, last_name, department_id, dept_name, punch_time_str in results:
-                punch_time = datetime.datetime.strptime(punch_time_str, "%Y-%m-%d %H:%M:%S")
-
-                # Create employee record if doesn't exist
-                if emp_id not in employee_attendance:
-                    # Get salary configuration based on department
-                    salary_config = get_salary_config(dept_name)
-                    daily_salary = salary_config["daily_salary"]
-                    gross_salary = daily_salary * num_days
-
-                    employee_attendance[emp_id] = {
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "department_id": department_id,
-                        "dept_name": dept_name,
-                        "daily_salary": daily_salary,
-                        "total_shifts": total_shifts,
-                        "late": 0,
-                        "absent": 0,
-                        "gross_salary": gross_salary,
-                        "punches": []
-                    }
-
-                # Add punch time to employee's record
-                employee_attendance[emp_id]["punches"].append(punch_time)
-
-            # Process attendance for each employee
-            for emp_id, data in employee_attendance.items():
-                # Check attendance status
-                status = check_attendance(
-                    data["punches"],
-                    start_date,
-                    end_date
-                )
-
-                # Update employee record with attendance status
-                data["late"] = status["Late Minutes"]
-                data["absent"] = status["Absent"]
-
-            # Create report directory if it doesn't exist
-            if not os.path.exists(report_directory):
-                os.makedirs(report_directory)
-
-            # Generate Excel report
-            generate_excel(excel_filename, employee_attendance, start_date, end_date)
-            print(f"Excel report generated successfully: {os.path.join(report_directory, excel_filename)}")
+        with report_timing.profiled(profile_path):
+            fingerprint = None
+            full_path = None
+            reuse = config.get("reuse_reports", True)
+            if reuse or prefetched is not None:
+                with timer.section("fingerprint"):
+                    db_marker = database_marker(config, start_date, end_date)
+                    if reuse:
+                        fingerprint = report_fingerprint(config, start_date, end_date, engine, writer, db_marker)
+                        full_path = reuse_report(config, fingerprint, excel_filename, writer)
+                    if not full_path and prefetched is not None:
+                        # Prefetched data is only used if nothing it depends on has changed since
+                        if prefetched.fingerprint == report_fingerprint(config, start_date, end_date, engine, None,
+                                                                        db_marker):
+                            employee_attendance = prefetched.employee_attendance
+
+            if full_path:
+                status = "reused"
+            else:
+                full_path, employee_count, department_paths = _generate_report(
+                    config, start_date, end_date, excel_filename, engine, timer.progress_callback(progress),
+                    cancel_event, writer, timer, employee_attendance)
+                if fingerprint:
+                    report_cache.record_report(config["report_directory"], fingerprint, full_path,
+                                               department_paths)
+                status = "ok"
+    except ReportCancelled:
+        status = "cancelled"
+        raise
+    finally:
+        timer.finish()
+        report_timing.write_timing_log(report_timing.timing_log_path(config, config_file), timer, status,
+                                       start_date=start_date, end_date=end_date, filename=excel_filename,
+                                       engine=engine, writer=writer, employees=employee_count,
+                                       prefetched=employee_attendance is not None)
+
+    print(f"Stage timings:\n{timer.summary_text()}")
+    return full_path
+
+
+def _generate_report(config, start_date, end_date, excel_filename, engine, progress, cancel_event, writer, timer,
+                     employee_attendance=None):
+    """
+    employee_attendance, if given, is already classified and the query and classify stages are skipped
+    Returns: (full path of the saved report, number of employees, {dept_name: department report path})
+    """
+    report_directory = config["report_directory"]
+
+    with report_executor(config.get("workers", 1)) as executor:
+        if employee_attendance is None:
+            employee_attendance = load_report_attendance(config, start_date, end_date, engine, progress=progress,
+                                                         cancel_event=cancel_event, executor=executor, timer=timer)
+        check_cancelled(cancel_event)
+
+        # Create report directory if it doesn't exist
+        if not os.path.exists(report_directory):
+            os.makedirs(report_directory)
+
+        # Start the per-department workbooks first so workers write them while the combined file is built
+        department_jobs = []
+        if config.get("per_department_workbooks"):
+            department_jobs = submit_department_workbooks(executor, excel_filename, employee_attendance,
+                                                          start_date, end_date, writer)
+
+        # Generate Excel report
+        full_path = generate_excel(excel_filename, employee_attendance, start_date, end_date,
+                                   progress=progress, cancel_event=cancel_event, writer=writer)
+        timer.count("write", len(employee_attendance))
+        print(f"Report generated successfully: {full_path}")
+
+        department_paths = {}
+        for dept_name, job in department_jobs:
+            check_cancelled(cancel_event)
+            department_paths[dept_name] = job.result() if executor else job()
+            print(f"Department report for {dept_name} generated successfully: {department_paths[dept_name]}")
+    return full_path, len(employee_attendance), department_paths
+
+
+# Hash of the punch and roster data behind a report, see report_cache.database_marker
+def database_marker(config, start_date, end_date):
+    """
+    Only the punches the report query would read are looked at. With "branches", the markers of
+    every branch database joined in config order
+    """
+    _, range_start, range_end = punch_query_params(start_date, end_date)
+
+    def branch_marker(branch_config):
+        with connect_punch_source(branch_config, branch_config["db_path"]) as conn:
+            return timenet_db.with_lock_retry(lambda: report_cache.database_marker(conn, range_start, range_end))
+
+    return ",".join(marker for _, marker in map_branches(config, branch_marker))
+
+
+# Fingerprint a report's inputs: range, config, shift rules, engine, writer and the database contents
+def report_fingerprint(config, start_date, end_date, engine, writer, db_marker):
+    """writer is None to fingerprint the classified attendance alone, as kept by a prefetch"""
+    return report_cache.report_fingerprint(config, start_date, end_date, shift_rules(), engine, writer, db_marker)
+
+
+# Serve an unchanged report written earlier with the same fingerprint, copying it if it was saved
+# under another filename
+def reuse_report(config, fingerprint, excel_filename, writer):
+    """Returns: the full path of the served report, or None when it has to be generated"""
+    report_directory = config["report_directory"]
+    entry = report_cache.find_report(report_directory, fingerprint)
+    if entry is None:
+        return None
+
+    full_path = report_path(config, excel_filename, writer)
+    department_paths = {dept_name: report_path(config, department_filename(excel_filename, dept_name), writer)
+                        for dept_name in entry["departments"]}
+    try:
+        report_cache.copy_report(entry, full_path, department_paths)
+    except OSError as e:
+        print(f"Could not reuse the earlier report, generating it again: {e}")
+        return None
+    if full_path != entry["path"]:
+        report_cache.record_report(report_directory, fingerprint, full_path, department_paths)
+
+    print(f"Inputs unchanged since {entry['path']} was written; serving it as {full_path}")
+    open_report(full_path)
+    return full_path
+
 
+# Process attendance data for a date range and generate Excel report
+def process_dates(start_date, end_date, excel_filename, engine=None, writer=None, profile_path=None):
+    try:
+        return generate_report(start_date, end_date, excel_filename, engine, writer=writer,
+                               profile_path=profile_path)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
     except ValueError as e:
@@ -164,62 +668,474 @@ def process_dates(start_date, end_date, excel_filename):
         print(f"An unexpected error occurred: {e}")
 
 
+# ===============================================================
+# BRANCH DATABASES
+# ===============================================================
+
+# The databases a report reads, as [(branch name, config for that database)]
+def report_branches(config):
+    """
+    "branches" is a list of {"name", "db_path"}, optionally with its own "punch_cache_path"; when it
+    is empty or missing the report reads "db_path" alone, under the branch name None. Each branch
+    config is config with that branch's db_path and, since caches cannot be shared, its own punch cache.
+    Raises ValueError for a branch without a name or db_path, or a name used twice
+    """
+    branches = config.get("branches")
+    if not branches:
+        return [(None, config)]
+
+    result = []
+    for branch in branches:
+        name = branch.get("name")
+        if not name or not branch.get("db_path"):
+            raise ValueError(f"Every branch needs a name and a db_path: {branch}")
+        if any(name == other_name for other_name, _ in result):
+            raise ValueError(f"Branch name used twice: {name}")
+
+        cache_base, cache_extension = os.path.splitext(punch_cache.default_cache_file)
+        cache_name = "".join(char if char.isalnum() or char in "-_" else "_" for char in name)
+        result.append((name, dict(config, db_path=branch["db_path"],
+                                  punch_cache_path=branch.get("punch_cache_path")
+                                  or f"{cache_base}_{cache_name}{cache_extension}")))
+    return result
+
+
+# Run function(branch config) for every branch database at once, one thread per branch
+def map_branches(config, function):
+    """
+    SQLite releases the GIL while it reads, so the branch databases are read concurrently.
+    Returns: [(branch name, result)] in config order; an error in any branch is raised once all have finished
+    """
+    branches = report_branches(config)
+    if len(branches) == 1:
+        name, branch_config = branches[0]
+        return [(name, function(branch_config))]
+
+    with ThreadPoolExecutor(max_workers=len(branches)) as pool:
+        futures = [(name, pool.submit(function, branch_config)) for name, branch_config in branches]
+        return [(name, future.result()) for name, future in futures]
+
+
+# Merge the attendance of every branch into one report
+def combine_branches(branch_attendance):
+    """
+    branch_attendance is [(branch name, {emp_id: employee record})] as returned by map_branches.
+    Returns: the records of a single unnamed database unchanged; otherwise {(branch, emp_id): record}
+    in branch order with each record's branch set, so ids repeated across branches never collide
+    """
+    if len(branch_attendance) == 1 and branch_attendance[0][0] is None:
+        return branch_attendance[0][1]
+
+    combined = {}
+    for name, employee_attendance in branch_attendance:
+        for emp_id, data in employee_attendance.items():
+            data.branch = name
+            combined[(name, emp_id)] = data
+    return combined
+
+
+# Load and classify the attendance of every branch database, see load_employee_attendance
+def load_report_attendance(config, start_date, end_date, engine=None, progress=None, cancel_event=None,
+                           executor=None, timer=None):
+    """
+    Branches are queried on their own threads and share executor, so with "workers" above 1 their
+    employees are classified in parallel worker processes. The concurrent load is timed as the
+    "query" stage of timer, with the row counts of every branch added up.
+    Returns: the combined records, see combine_branches
+    """
+    timer = timer or report_timing.ReportTimer()
+    if report_branches(config)[0][0] is None:
+        return load_employee_attendance(config, start_date, end_date, engine, progress=progress,
+                                        cancel_event=cancel_event, executor=executor, timer=timer)
+
+    if progress:
+        progress("query")
+
+    # ReportTimer is not thread-safe, so every branch times itself
+    def load_branch(branch_config):
+        branch_timer = report_timing.ReportTimer()
+        employee_attendance = load_employee_attendance(branch_config, start_date, end_date, engine,
+                                                       cancel_event=cancel_event, executor=executor,
+                                                       timer=branch_timer)
+        return employee_attendance, branch_timer
+
+    branch_results = map_branches(config, load_branch)
+    for _, (_, branch_timer) in branch_results:
+        for stage, record in branch_timer.stages.items():
+            timer.count(stage, record["rows"])
+    return combine_branches([(name, employee_attendance) for name, (employee_attendance, _) in branch_results])
+
+
+# Whether the records come from several branch databases
+def has_branches(employee_attendance):
+    return any(data.branch is not None for data in employee_attendance.values())
+
+
 # ===============================================================
 # ATTENDANCE CHECKING
 # ===============================================================
 
+# Convert a datetime.time to seconds since midnight
+def time_to_seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+# Roles of a minute in the compiled shift table
+role_none, role_in, role_late, role_out = 0, 1, 2, 3
+
+minutes_per_day = 1440
+shift_time_keys = ("start", "late", "absent", "end", "latest_out")
+
+
+# Parse "HH:MM" into minutes since midnight
+def parse_shift_time(value):
+    hours, minutes = (int(part) for part in value.split(":"))
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"'{value}' is not a time of day")
+    return hours * 60 + minutes
+
+
+# Compile shift definitions into windows and a minute-of-day lookup table
+def compile_shifts(shifts):
+    """
+    Each shift is {"name", "start", "late", "absent", "end", "latest_out"} with HH:MM times:
+    an on-time in punch is in [start, late), a late one in [late, absent), and an out punch
+    in [end, latest_out], up to the exact latest_out second.
+    Returns: (names, windows, table)
+    where windows[i] is (start, late, absent, end, latest_out) in seconds from midnight of the
+    shift's day (past 86400 for times after midnight) and table has one (shift_index, role,
+    day_adjust) entry per minute of day, or None outside every shift. The table gives the whole
+    latest_out minute the out role; classify_shift drops out punches past its first second.
+    day_adjust is -1 for minutes after midnight that belong to the previous day's shift.
+    Earlier shifts win where shifts overlap. Raises ValueError for invalid definitions.
+    """
+    names = []
+    windows = []
+    table = [None] * minutes_per_day
+    for shift_index, shift in enumerate(shifts):
+        name = shift.get("name") or f"Shift {shift_index + 1}"
+        try:
+            minutes = [parse_shift_time(shift[key]) for key in shift_time_keys]
+        except (KeyError, ValueError, AttributeError) as e:
+            raise ValueError(f"Invalid time for shift '{name}': {e}")
+
+        # A time before the previous one is on the next day
+        for i in range(1, len(minutes)):
+            if minutes[i] < minutes[i - 1]:
+                minutes[i] += minutes_per_day
+        start, late, absent, end, latest_out = minutes
+        if latest_out - start >= minutes_per_day:
+            raise ValueError(f"Shift '{name}' must be shorter than 24 hours")
+
+        for minute in range(start, latest_out + 1):
+            if table[minute % minutes_per_day] is not None:
+                continue
+            if minute < late:
+                role = role_in
+            elif minute < absent:
+                role = role_late
+            elif minute >= end:
+                role = role_out
+            else:
+                role = role_none
+            table[minute % minutes_per_day] = (shift_index, role, -(minute // minutes_per_day))
+
+        names.append(name)
+        windows.append(tuple(minute * 60 for minute in minutes))
+    return tuple(names), tuple(windows), table
+
+
+# Compiled rules for the configured shifts, see compile_shifts
+def shift_rules():
+    return _config_state()["shift_rules"]
+
+
+# Shift windows in seconds: (start, late, absent, end, latest_out) per configured shift
+def shift_windows():
+    return shift_rules()[1]
+
+
+def shift_names():
+    return shift_rules()[0]
+
+
+# Seconds past the midnight after a shift day whose punches can still belong to it: up to the end of
+# the last minute that the shift table gives to the previous day, 0 when no shift runs past midnight
+def shift_spill_seconds():
+    table = shift_rules()[2]
+    return max([0] + [(minute + 1) * 60 for minute, entry in enumerate(table) if entry and entry[2]])
+
+
+# Whether an employee's punches reach a shift day of the range, not only the spill past end_date
+def has_range_punches(punches, num_days):
+    """punches are in time order, so usually only the first one is looked at"""
+    range_end = num_days * 86400
+    if not punches or punches[0] < range_end:
+        return bool(punches)
+    table = shift_rules()[2]
+    for punch in punches:
+        if punch < range_end:
+            return True
+        entry = table[punch % 86400 // 60]
+        if entry is not None and entry[2]:
+            return True
+    return False
+
+
+# Runs of consecutive minutes in the shift table that map to the same shift, day and in/out side
+def shift_table_ranges(table):
+    """
+    In and late minutes of a shift form one run, since classify_shift only needs the first of them.
+    Returns: [(first_minute, last_minute, shift_index, is_out, day_adjust)], leaving out
+    minutes outside every in and out window
+    """
+    ranges = []
+    for minute, entry in enumerate(table):
+        if entry is None or entry[1] == role_none:
+            continue
+        key = (entry[0], int(entry[1] == role_out), entry[2])
+        if ranges and ranges[-1][1] == minute - 1 and ranges[-1][2:] == key:
+            ranges[-1] = (ranges[-1][0], minute) + key
+        else:
+            ranges.append((minute, minute) + key)
+    return ranges
+
+
+# Classify one shift from its punch codes
+def classify_shift(shift_codes, window):
+    """
+    Determine the attendance status of a single shift from punch codes in time order,
+    see bucket_punches. window is the shift's entry of shift_windows(); out punches after the
+    exact latest_out second are ignored, since the minute table covers the whole latest_out minute.
+    Returns: (status, late_minutes)
+    where status is:
+    '✓' for present and on time
+    '#' for present but late
+    '✕' for absent
+    """
+    latest_out = window[4]
+    punch_in = next((code for code in shift_codes if code & 3 != role_out), None)
+    if punch_in is None or not any(code & 3 == role_out and code >> 2 <= latest_out for code in shift_codes):
+        return '✕', 0
+
+    if punch_in & 3 == role_late:
+        return '#', ((punch_in >> 2) - window[1]) // 60
+
+    return '✓', 0
+
+
+# Split punches into shifts per day in a single pass, one table lookup per punch
+def bucket_punches(punch_offsets, table, num_shifts):
+    """
+    Return {day_offset: [[shift 0 codes], [shift 1 codes], ...]} from punches given as seconds from
+    midnight of day 0, keyed by the day the shift started. Each code is (seconds from that day's midnight << 2) | role,
+    in time order; punches outside every in and out window are dropped.
+    """
+    shifts_by_day = {}
+    for punch_offset in sorted(punch_offsets):
+        day_offset, second_of_day = divmod(punch_offset, 86400)
+        entry = table[second_of_day // 60]
+        if entry is None or entry[1] == role_none:
+            continue
+        shift_index, role, day_adjust = entry
+        shifts = shifts_by_day.get(day_offset + day_adjust)
+        if shifts is None:
+            shifts = shifts_by_day[day_offset + day_adjust] = [[] for _ in range(num_shifts)]
+        shifts[shift_index].append(((second_of_day - day_adjust * 86400) << 2) | role)
+    return shifts_by_day
+
+
+# Classify every shift of a day from its bucketed punches
+def classify_day(shifts, windows):
+    day_status = []
+    total_late_minutes = 0
+    for shift_codes, window in zip(shifts, windows):
+        status, late_minutes = classify_shift(shift_codes, window)
+        day_status.append(status)
+        total_late_minutes += late_minutes
+    return day_status, total_late_minutes
+
+
+# Check attendance for punches given as seconds from midnight of the first day
+def check_attendance_offsets(punch_offsets, num_days):
+    """
+    Classify every shift of days 0..num_days-1 using one pass over the punches
+    Returns: {"Late Minutes": int, "Absent": int, "Daily": [[status per shift], ...]}
+    with one "Daily" entry per day
+    """
+    status = {"Late Minutes": 0, "Absent": 0, "Daily": []}
+    _, windows, table = shift_rules()
+    shifts_by_day = bucket_punches(punch_offsets, table, len(windows))
+    no_punches = [[] for _ in windows]
+
+    for day_offset in range(num_days):
+        day_status, late_minutes = classify_day(shifts_by_day.get(day_offset) or no_punches, windows)
+        status["Late Minutes"] += late_minutes
+        status["Absent"] += day_status.count('✕')
+        status["Daily"].append(day_status)
+
+    return status
+
+
+# Convert punch datetimes to an array('i') of seconds from midnight of a start date
+def punch_offsets(punches, start_dt):
+    return array('i', ((punch.date() - start_dt).days * 86400 + time_to_seconds(punch.time()) for punch in punches))
+
+
 # Check attendance for an employee within the date range
 def check_attendance(punches, start_date, end_date):
-    status = {"Late Minutes": 0, "Absent": 0}
-    punches.sort()
+    """
+    Classify punch datetimes over the date range, see check_attendance_offsets
+    Returns: {"Late Minutes": int, "Absent": int, "Daily": [[status per shift], ...]}
+    """
+    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    return check_attendance_offsets(punch_offsets(punches, start_dt), (end_dt - start_dt).days + 1)
+
 
-    # Generate a list of all dates in the range
+# Classify every employee with the selected engine
+def classify_employees(employee_punches, start_date, end_date, engine="python"):
+    """
+    Returns: {emp_id: check_attendance status}
+    employee_punches is {emp_id: punches} with punches in seconds from midnight of start_date.
+    engine is "python" for the per-employee loop or "numpy" for the vectorized
+    engine in attendance_numpy, which falls back to "python" if NumPy is missing
+    """
     start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
     end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-    all_dates = [start_dt + datetime.timedelta(days=i) for i in range((end_dt - start_dt).days + 1)]
-
-    # Process each date in the range
-    for current_date in all_dates:
-        am_shift = []
-        pm_shift = []
-
-        # Filter punches for the current date and split by shift
-        for punch in punches:
-            if punch.date() == current_date:
-                if am_start <= punch.time() <= am_latest_out:
-                    am_shift.append(punch)
-                elif pm_start <= punch.time() <= pm_latest_out:
-                    pm_shift.append(punch)
-
-        # Check morning shift attendance
-        punch_in_am = next((p for p in am_shift if am_start <= p.time() < am_absent), None)
-        punch_out_am = next((p for p in am_shift if am_end <= p.time() <= am_latest_out), None)
-
-        if punch_in_am and punch_out_am:
-            # Employee was present but check if late
-            if am_late <= punch_in_am.time() < am_absent:
-                late_minutes = (datetime.datetime.combine(current_date, punch_in_am.time()) - datetime.datetime.combine(
-                    current_date, am_late)).total_seconds() // 60
-                status["Late Minutes"] += int(late_minutes)
-        else:
-            # Employee was absent for morning shift
-            status["Absent"] += 1
-
-        # Check afternoon shift attendance
-        punch_in_pm = next((p for p in pm_shift if pm_start <= p.time() < pm_absent), None)
-        punch_out_pm = next((p for p in pm_shift if pm_end <= p.time() <= pm_latest_out), None)
-
-        if punch_in_pm and punch_out_pm:
-            # Employee was present but check if late
-            if pm_late <= punch_in_pm.time() < pm_absent:
-                late_minutes = (datetime.datetime.combine(current_date, punch_in_pm.time()) - datetime.datetime.combine(
-                    current_date, pm_late)).total_seconds() // 60
-                status["Late Minutes"] += int(late_minutes)
+    num_days = (end_dt - start_dt).days + 1
+
+    if engine == "numpy":
+        try:
+            import attendance_numpy
+        except ImportError:
+            print("NumPy is not installed, falling back to the python engine")
         else:
-            # Employee was absent for afternoon shift
-            status["Absent"] += 1
+            return attendance_numpy.check_attendance_all(employee_punches, num_days)
+    elif engine != "python":
+        raise ValueError(f"Unknown attendance engine: {engine}")
 
-    return status
+    return {
+        emp_id: check_attendance_offsets(punches, num_days)
+        for emp_id, punches in employee_punches.items()
+    }
+
+
+# Classify a group of employee records in place and drop their raw punches
+def classify_and_release(employee_attendance, start_date, end_date, engine="python"):
+    if not employee_attendance:
+        return
+
+    employee_punches = {emp_id: data.punches for emp_id, data in employee_attendance.items()}
+    apply_statuses(employee_attendance, classify_employees(employee_punches, start_date, end_date, engine))
+
+
+# Copy classification results into employee records and drop their raw punches
+def apply_statuses(employee_attendance, statuses):
+    for emp_id, data in employee_attendance.items():
+        # Update employee record with attendance status
+        status = statuses[emp_id]
+        data.late = status["Late Minutes"]
+        data.absent = status["Absent"]
+        data.daily = status["Daily"]
+        data.punches = array('i')
+
+
+# ===============================================================
+# PAYROLL
+# ===============================================================
+
+# Payroll amounts are rounded half up to the centavo
+centavo = Decimal("0.01")
+
+# Rates for employees whose department has no configured salary
+unknown_department_payroll_rates = {key: Decimal(0) for key in unknown_department_rates}
+
+
+# Compute gross pay, deductions and net pay for every classified employee in one pass
+def compute_payroll(employee_attendance, num_days):
+    """
+    Fills in "gross_salary", "late_deduction", "absence_deduction" and "net_pay" on each record from
+    its "late" minutes and "absent" shifts. Amounts are worked out from the exact per-department
+    rates and each is rounded once, so net pay always equals gross less both deductions.
+    """
+    payroll_rates = get_payroll_rates()
+    for data in employee_attendance.values():
+        rates = payroll_rates.get(data.dept_name, unknown_department_payroll_rates)
+        gross_salary = (rates["daily_salary"] * num_days).quantize(centavo, ROUND_HALF_UP)
+        late_deduction = (rates["deduction_per_minute"] * data.late).quantize(centavo, ROUND_HALF_UP)
+        absence_deduction = (rates["absence_deduction"] * data.absent).quantize(centavo, ROUND_HALF_UP)
+
+        data.gross_salary = float(gross_salary)
+        data.late_deduction = float(late_deduction)
+        data.absence_deduction = float(absence_deduction)
+        data.net_pay = float(gross_salary - late_deduction - absence_deduction)
+
+
+# ===============================================================
+# PARALLEL PROCESSING
+# ===============================================================
+
+# Process pool sized by the "workers" config value; 1 keeps everything in this process, 0 uses every CPU
+@contextmanager
+def report_executor(workers):
+    workers = workers if workers else os.cpu_count() or 1
+    if workers <= 1:
+        yield None
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield executor
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Classify a shard of {emp_id: punches} in a worker process
+def classify_shard(shard, start_date, end_date, engine):
+    return classify_employees(shard, start_date, end_date, engine)
+
+
+# Send a group of employee records to the pool; their punches move into the shard
+def submit_shard(executor, employee_attendance, start_date, end_date, engine):
+    """Returns: (employee_attendance, future) to pass to apply_statuses once the future is done"""
+    shard = {}
+    for emp_id, data in employee_attendance.items():
+        shard[emp_id] = data.punches
+        data.punches = array('i')
+    return employee_attendance, executor.submit(classify_shard, shard, start_date, end_date, engine)
+
+
+# Report filename for one department, e.g. "attendance - Cook.xlsx"
+def department_filename(filename, dept_name):
+    stem, extension = os.path.splitext(filename)
+    safe_name = "".join("_" if char in '<>:"/\\|?*' else char for char in dept_name)
+    return f"{stem} - {safe_name}{extension}"
+
+
+# Write one department's workbook without opening it
+def write_department_workbook(filename, employee_attendance, start_date, end_date, writer=None):
+    return generate_excel(filename, employee_attendance, start_date, end_date, open_file=False, writer=writer)
+
+
+# Queue one workbook per department, in department name order
+def submit_department_workbooks(executor, filename, employee_attendance, start_date, end_date, writer=None):
+    """
+    Returns: [(dept_name, job)] where job is a future when executor is given,
+    otherwise a callable that writes the workbook when called
+    """
+    departments = {}
+    for emp_id, data in employee_attendance.items():
+        departments.setdefault(data.dept_name, {})[emp_id] = data
+
+    jobs = []
+    for dept_name in sorted(departments):
+        args = (department_filename(filename, dept_name), departments[dept_name], start_date, end_date, writer)
+        if executor:
+            jobs.append((dept_name, executor.submit(write_department_workbook, *args)))
+        else:
+            jobs.append((dept_name, functools.partial(write_department_workbook, *args)))
+    return jobs
 
 
 # ===============================================================
@@ -228,59 +1144,133 @@ def check_attendance(punches, start_date, end_date):
 
 def get_daily_attendance_status(punches, current_date):
     """
-    Determine attendance status for morning and afternoon shifts for a specific date
-    Returns: [morning_status, afternoon_status]
+    Determine attendance status for every configured shift on a specific date
+    Returns: [status per shift], e.g. [morning_status, afternoon_status]
     where status is:
     '✓' for present and on time
     '#' for present but late
     '✕' for absent
     """
-    am_shift = []
-    pm_shift = []
+    day_punches = [punch for punch in punches if punch.date() == current_date]
+    return check_attendance_offsets(punch_offsets(day_punches, current_date), 1)["Daily"][0]
+
+
+# Shared cell styles, created once and reused for every cell of every report
+# Create a horizontal-only border style (top and bottom only)
+horizontal_border = Border(
+    left=Side(style=None),
+    right=Side(style=None),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+bold_font = Font(bold=True)
+title_font = Font(size=20, bold=True)
+header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+attendance_fill = PatternFill(start_color="81A8FC", end_color="81A8FC", fill_type="solid")
+center_alignment = Alignment(horizontal='center')
+center_middle_alignment = Alignment(horizontal='center', vertical='center')
+left_middle_alignment = Alignment(horizontal='left', vertical='center')
+status_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+# Set column widths for better readability
+salary_column_widths = {
+    1: 5,  # Number
+    2: 25,  # Full Name
+    3: 15,  # Position
+    4: 12,  # Daily
+    5: 15,  # Monthly
+    6: 13,  # Late Mins.
+    7: 13,  # Absences
+    8: 15,  # Attendance
+    9: 15,  # Gross
+    10: 13,  # Late Ded.
+    11: 15,  # Absence Ded.
+    12: 15,  # Net Pay
+}
+salary_headers = ["", "NAME", "POSITION", "DAILY", "MONTHLY", "LATE MINS.", "ABSENCES", "ATTENDANCE",
+                  "GROSS", "LATE DED.", "ABSENCE DED.", "NET PAY"]
+# Record keys of the payroll value columns after ATTENDANCE, see compute_payroll
+payroll_keys = ["gross_salary", "late_deduction", "absence_deduction", "net_pay"]
+# Added after NET PAY when the report combines several branch databases, see report_branches
+branch_header = "BRANCH"
+branch_column_width = 15
+legend_text = "✓ = Present and on time      # = Present but late      ✕ = Absent for shift"
 
-    # Filter punches for the current date and split by shift
-    for punch in punches:
-        if punch.date() == current_date:
-            if am_start <= punch.time() <= am_latest_out:
-                am_shift.append(punch)
-            elif pm_start <= punch.time() <= pm_latest_out:
-                pm_shift.append(punch)
-
-    # Check morning shift attendance
-    punch_in_am = next((p for p in am_shift if am_start <= p.time() < am_absent), None)
-    punch_out_am = next((p for p in am_shift if am_end <= p.time() <= am_latest_out), None)
-
-    if punch_in_am and punch_out_am:
-        if am_late <= punch_in_am.time() < am_absent:
-            am_status = '#'  # Late
-        else:
-            am_status = '✓'  # Present and on time
-    else:
-        am_status = '✕'  # Absent
 
-    # Check afternoon shift attendance
-    punch_in_pm = next((p for p in pm_shift if pm_start <= p.time() < pm_absent), None)
-    punch_out_pm = next((p for p in pm_shift if pm_end <= p.time() <= pm_latest_out), None)
+# Generate the Excel report
+def generate_excel(filename, employee_attendance, start_date, end_date, write_only=None,
+                   progress=None, cancel_event=None, open_file=True, writer=None):
+    """
+    Build and save the report with one of report_writers, selected by writer or
+    "report_writer" in config.json ("openpyxl" if unset). The filename's extension is
+    replaced with the writer's own (.csv, .jsonl) when they differ.
+    For the openpyxl writer, write_only selects the streaming writer (defaults to
+    "excel_write_only" in config.json, True if unset); both produce the same cells and formatting.
+    Returns: the full path of the saved report
+    """
+    # Load config before generating excel
+    config = load_config()
+
+    writer = writer or config.get("report_writer", "openpyxl")
+    full_path = report_path(config, filename, writer)
+    write_report, extension = report_writers[writer]
 
-    if punch_in_pm and punch_out_pm:
-        if pm_late <= punch_in_pm.time() < pm_absent:
-            pm_status = '#'  # Late
-        else:
-            pm_status = '✓'  # Present and on time
+    if progress:
+        progress("write")
+    if writer == "openpyxl":
+        if write_only is None:
+            write_only = config.get("excel_write_only", True)
+        write_report(full_path, employee_attendance, start_date, end_date, cancel_event, progress, write_only)
     else:
-        pm_status = '✕'  # Absent
+        write_report(full_path, employee_attendance, start_date, end_date, cancel_event, progress)
+        # These writers stream rows straight into the file, so saving is done once writing is;
+        # the stage is still reported so progress always reaches the last step
+        if progress:
+            progress("save")
 
-    return [am_status, pm_status]
+    if open_file:
+        open_report(full_path)
 
+    return full_path
+
+
+# Where a report is saved: filename in the report directory, with the writer's extension
+def report_path(config, filename, writer):
+    if writer not in report_writers:
+        raise ValueError(f"Unknown report writer: {writer}")
+    extension = report_writers[writer][1]
+    return os.path.join(config["report_directory"], os.path.splitext(filename)[0] + extension)
+
+
+# Try to open an Excel report automatically
+def open_report(full_path):
+    if os.path.splitext(full_path)[1] != ".xlsx":
+        return
+    try:
+        os.startfile(full_path) if os.name == 'nt' else subprocess.call(['open', full_path])
+    except Exception as e:
+        print(f"Error opening Excel file: {e}")
+
+
+# Daily Attendance row height: one 15pt line per shift
+def status_row_height():
+    return 15 * len(shift_windows())
+
+
+# Get the per-shift statuses (e.g. [morning, afternoon]) for every date of an employee's row
+def iter_daily_status(data, date_list):
+    if data.daily is not None:
+        return data.daily
+    return check_attendance_offsets(data.punches, len(date_list))["Daily"]
 
-# Generate the Excel report
-def generate_excel(filename, employee_attendance, start_date, end_date):
-    # Load config before generating excel
-    config = load_config()
-    report_directory = config["report_directory"]
 
+# Build the report workbook in memory with openpyxl's normal mode
+def build_workbook(employee_attendance, start_date, end_date, cancel_event=None):
     workbook = openpyxl.Workbook()
 
+    branch_column = has_branches(employee_attendance)
+    headers = salary_headers + [branch_header] if branch_column else salary_headers
+
     # Rename the default sheet to 'Attendance'
     salary_sheet = workbook.active
     salary_sheet.title = "Attendance"
@@ -295,55 +1285,37 @@ def generate_excel(filename, employee_attendance, start_date, end_date):
     # FIRST SHEET: SALARY REPORT
     # ------------------------------------------------------
 
-    # Create a horizontal-only border style (top and bottom only)
-    horizontal_border = Border(
-        left=Side(style=None),
-        right=Side(style=None),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    # Set column widths for better readability
-    column_widths = {
-        1: 5,  # Number
-        2: 25,  # Full Name
-        3: 15,  # Position
-        4: 12,  # Daily
-        5: 15,  # Monthly
-        6: 13,  # Late Mins.
-        7: 13,  # Absences
-        8: 15,  # Attendance
-    }
-
     # Apply column widths
-    for col_num, width in column_widths.items():
+    for col_num, width in salary_column_widths.items():
         salary_sheet.column_dimensions[get_column_letter(col_num)].width = width
+    if branch_column:
+        salary_sheet.column_dimensions[get_column_letter(len(headers))].width = branch_column_width
 
     # Create headers with formatting
-    headers = ["", "NAME", "POSITION", "DAILY", "MONTHLY", "LATE MINS.", "ABSENCES", "ATTENDANCE"]
-
     header_row = 1
     for col_num, header_text in enumerate(headers, 1):
         cell = salary_sheet.cell(row=header_row, column=col_num, value=header_text)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center', vertical="center")
+        cell.font = bold_font
+        cell.fill = header_fill
+        cell.alignment = center_middle_alignment
         cell.border = horizontal_border
 
     # Add employee data starting from row 2
     row_num = 2
     for i, (emp_id, data) in enumerate(employee_attendance.items(), 1):
+        check_cancelled(cancel_event)
+
         # Map column data
-        daily_salary = data["daily_salary"]
-        late_minutes = data["late"]
-        absences = data["absent"] / 2
+        daily_salary = data.daily_salary
+        late_minutes = data.late
+        absences = data.absent / len(shift_windows())
         monthly_salary = daily_salary * 30.00
-        full_name = data["last_name"] + ", " + data["first_name"]
+        full_name = data.last_name + ", " + data.first_name
 
         # Add the basic data cells
         salary_sheet.cell(row=row_num, column=1, value=f"{i}.")
         salary_sheet.cell(row=row_num, column=2, value=full_name)
-        salary_sheet.cell(row=row_num, column=3, value=data["dept_name"])
+        salary_sheet.cell(row=row_num, column=3, value=data.dept_name)
 
         # Daily Salary - editable with initial calculated value
         daily_salary_cell = salary_sheet.cell(row=row_num, column=4, value=daily_salary)
@@ -370,7 +1342,16 @@ def generate_excel(filename, employee_attendance, start_date, end_date):
         attendance_cell.value = attendance_formula  # Set the formula as the value
         attendance_cell.number_format = '#,##0.0'
         attendance_cell.border = horizontal_border
-        attendance_cell.fill = PatternFill(start_color="81A8FC", end_color="81A8FC", fill_type="solid")
+        attendance_cell.fill = attendance_fill
+
+        # Payroll amounts as values
+        for col_num, key in enumerate(payroll_keys, 9):
+            payroll_cell = salary_sheet.cell(row=row_num, column=col_num, value=getattr(data, key))
+            payroll_cell.number_format = '#,##0.00'
+            payroll_cell.border = horizontal_border
+
+        if branch_column:
+            salary_sheet.cell(row=row_num, column=len(headers), value=data.branch).border = horizontal_border
 
         row_num += 1
 
@@ -395,19 +1376,18 @@ def generate_excel(filename, employee_attendance, start_date, end_date):
     # Create title for attendance sheet
     attendance_title = f"Daily Attendance Record ({start_date} - {end_date})"
     title_cell = attendance_sheet.cell(row=1, column=1, value=attendance_title)
-    title_cell.font = Font(size=20, bold=True)
+    title_cell.font = title_font
     # Merge cells based on number of dates (3 base columns + number of date columns)
     end_column = 3 + len(date_list)
     attendance_sheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=end_column)
-    title_cell.alignment = Alignment(horizontal='center')
+    title_cell.alignment = center_alignment
 
     # Legend for symbols
     legend_row = 2
-    legend_text = "✓ = Present and on time      # = Present but late      ✕ = Absent for shift"
     legend_cell = attendance_sheet.cell(row=legend_row, column=1, value=legend_text)
-    legend_cell.font = Font(bold=True)
+    legend_cell.font = bold_font
     attendance_sheet.merge_cells(start_row=legend_row, start_column=1, end_row=legend_row, end_column=end_column)
-    legend_cell.alignment = Alignment(horizontal='center')
+    legend_cell.alignment = center_alignment
 
     # Create attendance table headers
     attendance_header_row = 4
@@ -434,9 +1414,9 @@ def generate_excel(filename, employee_attendance, start_date, end_date):
     # Add headers with formatting
     for col_num, header_text in enumerate(attendance_headers, 1):
         cell = attendance_sheet.cell(row=attendance_header_row, column=col_num, value=header_text)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
+        cell.font = bold_font
+        cell.fill = header_fill
+        cell.alignment = center_alignment
         cell.border = horizontal_border
 
     # Add employee attendance data starting from the row after headers
@@ -444,45 +1424,323 @@ def generate_excel(filename, employee_attendance, start_date, end_date):
 
     # Add data for each employee
     for i, (emp_id, data) in enumerate(employee_attendance.items(), 1):
+        check_cancelled(cancel_event)
+
         # Add employee base info
         id_cell = attendance_sheet.cell(row=row_num, column=1, value=i)
         id_cell.border = horizontal_border
-        id_cell.alignment = Alignment(horizontal='center', vertical='center')
+        id_cell.alignment = center_middle_alignment
 
-        first_name_cell = attendance_sheet.cell(row=row_num, column=2, value=data["first_name"])
+        first_name_cell = attendance_sheet.cell(row=row_num, column=2, value=data.first_name)
         first_name_cell.border = horizontal_border
-        first_name_cell.alignment = Alignment(horizontal='left', vertical='center')
+        first_name_cell.alignment = left_middle_alignment
 
-        last_name_cell = attendance_sheet.cell(row=row_num, column=3, value=data["last_name"])
+        last_name_cell = attendance_sheet.cell(row=row_num, column=3, value=data.last_name)
         last_name_cell.border = horizontal_border
-        last_name_cell.alignment = Alignment(horizontal='left', vertical='center')
+        last_name_cell.alignment = left_middle_alignment
 
         # Add attendance status for each date
-        for col_idx, current_date in enumerate(date_list, 4):
-            # Get morning and afternoon status for this date
-            am_pm_status = get_daily_attendance_status(data["punches"], current_date)
-
-            # Create a cell with both statuses (morning/afternoon)
-            cell_value = f"{am_pm_status[0]}\n{am_pm_status[1]}"
+        # Morning and afternoon status per date, reusing the classification from check_attendance
+        for col_idx, day_status in enumerate(iter_daily_status(data, date_list), 4):
+            # Create a cell with one status per shift (e.g. morning/afternoon), one per line
+            cell_value = "\n".join(day_status)
             cell = attendance_sheet.cell(row=row_num, column=col_idx, value=cell_value)
 
             # Format the cell
-            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            cell.alignment = status_alignment
             cell.border = horizontal_border
 
-        # Make the row taller to accommodate two lines of text
-        attendance_sheet.row_dimensions[row_num].height = 30
+        # Make the row taller to accommodate one line of text per shift
+        attendance_sheet.row_dimensions[row_num].height = status_row_height()
         row_num += 1
 
+    # Optional per-branch copies of the first sheet
+    for layout in branch_sheet_layouts(employee_attendance, cancel_event):
+        add_layout_sheet(workbook, layout)
+
     # Make the attendance sheet active when opening the file
     workbook.active = 0
+    return workbook
+
+
+# ===============================================================
+# REPORT LAYOUT
+# ===============================================================
+
+# Cell styles by name, shared by every report writer that supports formatting
+cell_styles = {
+    "header": {"font": bold_font, "fill": header_fill, "alignment": center_middle_alignment,
+               "border": horizontal_border},
+    "cell": {"border": horizontal_border},
+    "money": {"border": horizontal_border, "number_format": '#,##0.00'},
+    "days": {"border": horizontal_border, "number_format": '#,##0.0'},
+    "attendance": {"fill": attendance_fill, "border": horizontal_border, "number_format": '#,##0.0'},
+    "title": {"font": title_font, "alignment": center_alignment},
+    "legend": {"font": bold_font, "alignment": center_alignment},
+    "daily_header": {"font": bold_font, "fill": header_fill, "alignment": center_alignment,
+                     "border": horizontal_border},
+    "daily_id": {"alignment": center_middle_alignment, "border": horizontal_border},
+    "daily_name": {"alignment": left_middle_alignment, "border": horizontal_border},
+    "daily_status": {"alignment": status_alignment, "border": horizontal_border},
+}
+
+
+# Rows of the "Attendance" sheet as [(value, style name), ...]
+def salary_sheet_rows(employee_attendance, cancel_event=None, branch_column=False):
+    headers = salary_headers + [branch_header] if branch_column else salary_headers
+    yield [(header_text, "header") for header_text in headers]
+
+    for i, data in enumerate(employee_attendance.values(), 1):
+        check_cancelled(cancel_event)
+        row_num = i + 1
+        daily_salary = data.daily_salary
+        full_name = data.last_name + ", " + data.first_name
+
+        row = [
+            (f"{i}.", "cell"),
+            (full_name, "cell"),
+            (data.dept_name, "cell"),
+            (daily_salary, "money"),
+            (daily_salary * 30.00, "money"),
+            (data.late, "cell"),
+            (data.absent / len(shift_windows()), "days"),
+            (f"=15-G{row_num}", "attendance"),  # Attendance formula referencing the absences column
+        ] + [(getattr(data, key), "money") for key in payroll_keys]
+        if branch_column:
+            row.append((data.branch, "cell"))
+        yield row
+
+
+# Rows of the "Daily Attendance" sheet as [(value, style name), ...]
+def daily_sheet_rows(employee_attendance, start_date, end_date, date_list, cancel_event=None):
+    yield [(f"Daily Attendance Record ({start_date} - {end_date})", "title")]
+    yield [(legend_text, "legend")]
+    yield []
+
+    # Headers: ID, First Name, Last Name and one MM/DD column per date
+    attendance_headers = ["ID", "First Name", "Last Name"] + [date.strftime("%m/%d") for date in date_list]
+    yield [(header_text, "daily_header") for header_text in attendance_headers]
+
+    for i, data in enumerate(employee_attendance.values(), 1):
+        check_cancelled(cancel_event)
+        row = [(i, "daily_id"), (data.first_name, "daily_name"), (data.last_name, "daily_name")]
+        for day_status in iter_daily_status(data, date_list):
+            row.append(("\n".join(day_status), "daily_status"))
+        yield row
+
+
+# Describe both report sheets independently of the library that writes them
+def report_layout(employee_attendance, start_date, end_date, cancel_event=None):
+    """
+    Returns: a list of sheets, each a dict with "title", "freeze_panes", "column_widths" ({column: width}),
+    "row_heights" ({row: height}), "merged_cells" (["A1:B1", ...]) and "rows", a generator of
+    [(value, style name), ...] lists with style names from cell_styles
+    """
+    # Generate date list for the selected range
+    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    date_list = [start_dt + datetime.timedelta(days=i) for i in range((end_dt - start_dt).days + 1)]
+    end_column = 3 + len(date_list)
+    end_column_letter = get_column_letter(end_column)
+    num_employees = len(employee_attendance)
+
+    daily_column_widths = {1: 8, 2: 18, 3: 18}  # ID, First Name, Last Name
+    daily_column_widths.update((col_num, 8) for col_num in range(4, end_column + 1))
+
+    return [
+        salary_sheet_layout("Attendance", employee_attendance, cancel_event, has_branches(employee_attendance)),
+        {
+            "title": "Daily Attendance",
+            "freeze_panes": None,
+            "column_widths": daily_column_widths,
+            "row_heights": {row_num: status_row_height() for row_num in range(5, num_employees + 5)},
+            "merged_cells": [f"A1:{end_column_letter}1", f"A2:{end_column_letter}2"],
+            "rows": daily_sheet_rows(employee_attendance, start_date, end_date, date_list, cancel_event),
+        },
+    ] + branch_sheet_layouts(employee_attendance, cancel_event)
+
+
+# Layout of an "Attendance" sheet for the given records, see report_layout
+def salary_sheet_layout(title, employee_attendance, cancel_event=None, branch_column=False):
+    row_heights = {1: 26}
+    row_heights.update((row_num, 22.5) for row_num in range(2, len(employee_attendance) + 2))
+    column_widths = salary_column_widths
+    if branch_column:
+        column_widths = dict(salary_column_widths)
+        column_widths[len(salary_headers) + 1] = branch_column_width
+
+    return {
+        "title": title,
+        "freeze_panes": "B2",
+        "column_widths": column_widths,
+        "row_heights": row_heights,
+        "merged_cells": [],
+        "rows": salary_sheet_rows(employee_attendance, cancel_event, branch_column),
+    }
+
+
+# With "per_branch_sheets", one "Attendance - <branch>" sheet per branch after the combined sheets
+def branch_sheet_layouts(employee_attendance, cancel_event=None):
+    if not load_config().get("per_branch_sheets") or not has_branches(employee_attendance):
+        return []
+
+    branch_attendance = {}
+    for key, data in employee_attendance.items():
+        branch_attendance.setdefault(data.branch, {})[key] = data
+
+    layouts = []
+    titles = set()
+    for branch, records in branch_attendance.items():
+        title = branch_sheet_title(branch, titles)
+        titles.add(title)
+        layouts.append(salary_sheet_layout(title, records, cancel_event))
+    return layouts
+
+
+# Sheet title for a branch: at most 31 characters, none of them []:*?/ or a backslash
+def branch_sheet_title(branch, used_titles):
+    name = "".join("_" if char in "[]:*?/\\" else char for char in branch)
+    title = f"Attendance - {name}"[:31]
+    suffix = 2
+    while title.lower() in {used.lower() for used in used_titles}:
+        title = f"Attendance - {name}"[:31 - len(f" ({suffix})")] + f" ({suffix})"
+        suffix += 1
+    return title
+
+
+# Flat per-employee values of the "Attendance" sheet for CSV/JSONL payroll exports
+def payroll_records(employee_attendance, start_date, end_date):
+    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    date_list = [start_dt + datetime.timedelta(days=i) for i in range((end_dt - start_dt).days + 1)]
+
+    for i, data in enumerate(employee_attendance.values(), 1):
+        absences = data.absent / len(shift_windows())
+        record = {
+            "no": i,
+            "employee_id": data.emp_id,
+            "last_name": data.last_name,
+            "first_name": data.first_name,
+            "position": data.dept_name,
+            "daily": data.daily_salary,
+            "monthly": data.daily_salary * 30.00,
+            "late_minutes": data.late,
+            "absences": absences,
+            "attendance": 15 - absences,
+            "gross": data.gross_salary,
+            "late_deduction": data.late_deduction,
+            "absence_deduction": data.absence_deduction,
+            "net_pay": data.net_pay,
+            "daily_status": {
+                current_date.isoformat(): "".join(day_status)
+                for current_date, day_status in zip(date_list, iter_daily_status(data, date_list))
+            },
+        }
+        if data.branch is not None:
+            record["branch"] = data.branch
+        yield record
+
+
+# ===============================================================
+# REPORT WRITERS
+# ===============================================================
+
+# Build the report workbook with write-only worksheets, streaming rows as they are produced
+def build_workbook_streaming(employee_attendance, start_date, end_date, cancel_event=None):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheets = []
+
+    try:
+        for layout in report_layout(employee_attendance, start_date, end_date, cancel_event):
+            sheet = workbook.create_sheet(title=layout["title"])
+            sheets.append(sheet)
+
+            # Column widths, row heights, panes and merges must be set before rows are written
+            sheet.freeze_panes = layout["freeze_panes"]
+            for col_num, width in layout["column_widths"].items():
+                sheet.column_dimensions[get_column_letter(col_num)].width = width
+            for row_num, height in layout["row_heights"].items():
+                sheet.row_dimensions[row_num].height = height
+            for cell_range in layout["merged_cells"]:
+                sheet.merged_cells.add(cell_range)
+
+            for row in layout["rows"]:
+                sheet.append([styled_cell(sheet, value, style) for value, style in row])
+    except ReportCancelled:
+        # Finish the half-written sheet streams so their temporary files close cleanly
+        for sheet in sheets:
+            if not sheet.closed:
+                sheet.close()
+        raise
+
+    return workbook
+
+
+# Add a report_layout sheet to a normal-mode workbook
+def add_layout_sheet(workbook, layout):
+    sheet = workbook.create_sheet(title=layout["title"])
+    sheet.freeze_panes = layout["freeze_panes"]
+    for col_num, width in layout["column_widths"].items():
+        sheet.column_dimensions[get_column_letter(col_num)].width = width
+    for row_num, height in layout["row_heights"].items():
+        sheet.row_dimensions[row_num].height = height
+
+    for row_num, row in enumerate(layout["rows"], 1):
+        for col_num, (value, style) in enumerate(row, 1):
+            cell = sheet.cell(row=row_num, column=col_num, value=value)
+            for attribute, style_value in cell_styles[style].items():
+                setattr(cell, attribute, style_value)
+    for cell_range in layout["merged_cells"]:
+        sheet.merge_cells(cell_range)
+    return sheet
+
+
+# Create a write-only cell with one of the shared cell_styles
+def styled_cell(sheet, value, style):
+    cell = WriteOnlyCell(sheet, value=value)
+    for attribute, style_value in cell_styles[style].items():
+        setattr(cell, attribute, style_value)
+    return cell
+
+
+# Report writers all take (full_path, employee_attendance, start_date, end_date, cancel_event, progress)
+# and write the finished file to full_path
+
+# Save the report with openpyxl (write-only or normal mode, see generate_excel)
+def write_openpyxl_report(full_path, employee_attendance, start_date, end_date, cancel_event=None,
+                          progress=None, write_only=True):
+    if write_only:
+        workbook = build_workbook_streaming(employee_attendance, start_date, end_date, cancel_event)
+    else:
+        workbook = build_workbook(employee_attendance, start_date, end_date, cancel_event)
+    check_cancelled(cancel_event)
 
     # Save the workbook
-    full_path = os.path.join(report_directory, filename)
+    if progress:
+        progress("save")
     workbook.save(full_path)
 
-    # Try to open the Excel file automatically
-    try:
-        os.startfile(full_path) if os.name == 'nt' else subprocess.call(['open', full_path])
-    except Exception as e:
-        print(f"Error opening Excel file: {e}")
\ No newline at end of file
+
+# Stream the SpreadsheetML parts straight into the .xlsx zip; rows are written and saved in one pass
+def write_xml_report(full_path, employee_attendance, start_date, end_date, cancel_event=None, progress=None):
+    report_formats.write_xlsx(full_path, report_layout(employee_attendance, start_date, end_date, cancel_event))
+
+
+def write_csv_report(full_path, employee_attendance, start_date, end_date, cancel_event=None, progress=None):
+    columns = report_formats.csv_columns
+    if has_branches(employee_attendance):
+        columns = columns + [report_formats.branch_csv_column]
+    report_formats.write_csv(full_path, payroll_records(employee_attendance, start_date, end_date), columns)
+
+
+def write_jsonl_report(full_path, employee_attendance, start_date, end_date, cancel_event=None, progress=None):
+    report_formats.write_jsonl(full_path, payroll_records(employee_attendance, start_date, end_date))
+
+
+# Report writers by name: (writer function, file extension)
+report_writers = {
+    "openpyxl": (write_openpyxl_report, ".xlsx"),
+    "xlsx": (write_xml_report, ".xlsx"),
+    "csv": (write_csv_report, ".csv"),
+    "jsonl": (write_jsonl_report, ".jsonl"),
+}
@@ -0,0 +1,104 @@
+import numpy as np
+
+import attendance
+
+# Status codes used while classifying, mapped to the report symbols at the end
+ABSENT, PRESENT, LATE = 0, 1, 2
+STATUS_SYMBOLS = np.array(['✕', '✓', '#'])
+
+
+# ===============================================================
+# COLUMNAR PUNCH LOADING
+# ===============================================================
+
+# Flatten every employee's punches into employee index, day offset and second-of-day arrays
+def load_punch_arrays(employee_punches):
+    """
+    Returns: (emp_ids, emp_index, day_offset, second_of_day)
+    where emp_ids lists the employees in report order and the other three are
+    parallel arrays with one entry per punch
+    """
+    emp_ids = list(employee_punches.keys())
+    punch_arrays = [np.frombuffer(employee_punches[emp_id], dtype=np.intc) for emp_id in emp_ids]
+    counts = np.fromiter((len(punches) for punches in punch_arrays), dtype=np.int64, count=len(punch_arrays))
+
+    emp_index = np.repeat(np.arange(len(emp_ids), dtype=np.int64), counts)
+    offsets = np.concatenate(punch_arrays).astype(np.int64) if punch_arrays else np.zeros(0, dtype=np.int64)
+    day_offset, second_of_day = np.divmod(offsets, 86400)
+    return emp_ids, emp_index, day_offset, second_of_day
+
+
+# ===============================================================
+# VECTORIZED CLASSIFICATION
+# ===============================================================
+
+# Columns of the compiled minute table: shift index (-1 outside every shift), role and day adjustment
+def shift_table_arrays(table):
+    shift_index = np.array([entry[0] if entry else -1 for entry in table], dtype=np.int64)
+    role = np.array([entry[1] if entry else attendance.role_none for entry in table], dtype=np.int64)
+    day_adjust = np.array([entry[2] if entry else 0 for entry in table], dtype=np.int64)
+    return shift_index, role, day_adjust
+
+
+# Classify every shift for every employee in one pass
+def check_attendance_all(employee_punches, num_days):
+    """
+    Vectorized equivalent of attendance.check_attendance_offsets over the whole roster,
+    from {emp_id: array('i') of punch seconds} as given to attendance.classify_employees
+    Returns: {emp_id: {"Late Minutes": int, "Absent": int, "Daily": [[status per shift], ...]}}
+    """
+    _, windows, table = attendance.shift_rules()
+    num_shifts = len(windows)
+    emp_ids, emp_index, day_offset, second_of_day = load_punch_arrays(employee_punches)
+    num_cells = len(emp_ids) * num_days * num_shifts
+
+    # One table lookup per punch gives its shift, role and the day the shift started
+    table_shift, table_role, table_day_adjust = shift_table_arrays(table)
+    minute = second_of_day // 60
+    shift, role, day_adjust = table_shift[minute], table_role[minute], table_day_adjust[minute]
+    day_offset = day_offset + day_adjust
+    shift_seconds = second_of_day - day_adjust * 86400
+
+    # Keep punches in an in or out window of a day in the range, sorted by (cell, time); as in
+    # attendance.classify_shift, out punches after the exact latest_out second are dropped
+    latest_out = np.array([window[4] for window in windows], dtype=np.int64)
+    late_out = (role == attendance.role_out) & (shift_seconds > latest_out[shift])
+    keep = (role != attendance.role_none) & ~late_out & (day_offset >= 0) & (day_offset < num_days)
+    keys = ((emp_index * num_days + day_offset) * num_shifts + shift)[keep]
+    shift_seconds, role = shift_seconds[keep], role[keep]
+    order = np.lexsort((shift_seconds, keys))
+    keys, shift_seconds, role = keys[order], shift_seconds[order], role[order]
+
+    # First in punch (on time or late) per cell
+    in_mask = role != attendance.role_out
+    in_keys, first_in = np.unique(keys[in_mask], return_index=True)
+    in_role = np.full(num_cells, attendance.role_none, dtype=np.int64)
+    in_role[in_keys] = role[in_mask][first_in]
+    in_seconds = np.zeros(num_cells, dtype=np.int64)
+    in_seconds[in_keys] = shift_seconds[in_mask][first_in]
+
+    # Any out punch per cell
+    has_out = np.zeros(num_cells, dtype=bool)
+    has_out[keys[~in_mask]] = True
+
+    present = (in_role != attendance.role_none) & has_out
+    is_late = present & (in_role == attendance.role_late)
+    late_seconds = np.array([window[1] for window in windows], dtype=np.int64)
+    late_minutes = np.where(is_late, (in_seconds - np.tile(late_seconds, num_cells // num_shifts)) // 60, 0)
+    status = np.where(present, np.where(is_late, LATE, PRESENT), ABSENT)
+
+    # Reshape to (employee, day, shift) and total per employee
+    shape = (len(emp_ids), num_days, num_shifts)
+    status = status.reshape(shape)
+    late_totals = late_minutes.reshape(len(emp_ids), -1).sum(axis=1)
+    absent_totals = (status == ABSENT).reshape(len(emp_ids), -1).sum(axis=1)
+    daily = STATUS_SYMBOLS[status].tolist()
+
+    return {
+        emp_id: {
+            "Late Minutes": int(late_totals[i]),
+            "Absent": int(absent_totals[i]),
+            "Daily": daily[i]
+        }
+        for i, emp_id in enumerate(emp_ids)
+    }
@@ -0,0 +1,200 @@
+import argparse
+import bisect
+import calendar
+import datetime
+import os
+import sqlite3
+import sys
+from array import array
+
+import attendance
+
+default_filename_template = "attendance_{start}_to_{end}.xlsx"
+
+
+# ===============================================================
+# PAY PERIODS
+# ===============================================================
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+# Split [first, last] into calendar periods, clipped to the given dates
+def pay_periods(first, last, period):
+    """
+    period is "semi-monthly" (1st-15th and 16th-end of month), "monthly" or "daily"
+    Returns: [(start_date, end_date)] as YYYY-MM-DD strings
+    """
+    periods = []
+    month_start = first.replace(day=1)
+    while month_start <= last:
+        month_end = month_start.replace(day=calendar.monthrange(month_start.year, month_start.month)[1])
+        if period == "monthly":
+            bounds = [(month_start, month_end)]
+        elif period == "semi-monthly":
+            bounds = [(month_start, month_start.replace(day=15)), (month_start.replace(day=16), month_end)]
+        elif period == "daily":
+            bounds = [(month_start + datetime.timedelta(days=day), month_start + datetime.timedelta(days=day))
+                      for day in range(month_end.day)]
+        else:
+            raise ValueError(f"Unknown pay period: {period}")
+
+        for period_start, period_end in bounds:
+            period_start, period_end = max(period_start, first), min(period_end, last)
+            if period_start <= period_end:
+                periods.append((period_start.isoformat(), period_end.isoformat()))
+        month_start = month_end + datetime.timedelta(days=1)
+    return periods
+
+
+# Parse "YYYY-MM-DD:YYYY-MM-DD" into a (start_date, end_date) pair
+def parse_range(value):
+    try:
+        start, end = value.split(":")
+        start_dt, end_dt = _parse_date(start), _parse_date(end)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected START:END as YYYY-MM-DD:YYYY-MM-DD, got '{value}'")
+    if end_dt < start_dt:
+        raise argparse.ArgumentTypeError(f"end date is before start date in '{value}'")
+    return start_dt.isoformat(), end_dt.isoformat()
+
+
+# ===============================================================
+# SHARED PUNCH DATA
+# ===============================================================
+
+# Read every punch of the union range in one query
+def load_union_punches(config, start_date, end_date):
+    """
+    Returns: [(employee_row, punches)] as yielded by attendance.query_employee_punches,
+    with punches in seconds from midnight of start_date
+    """
+    with attendance.connect_punch_source(config, config["db_path"]) as conn:
+        return list(attendance.query_employee_punches(conn, start_date, end_date, config.get("query_mode", "raw")))
+
+
+# Build unclassified employee records for one range from the union punches
+def slice_attendance(union_punches, union_start, start_date, end_date, departments=None):
+    """
+    Punch offsets are shifted to start_date. Each employee's punches are in time order, so the
+    range is cut with bisect and only its own punches are shifted. Employees without punches in
+    the range are left out, as they would be by a query over that range alone.
+    Returns: {emp_id: employee record} ready for attendance.classify_and_release
+    """
+    shift_seconds = (_parse_date(start_date) - _parse_date(union_start)).days * 86400
+    num_days = (_parse_date(end_date) - _parse_date(start_date)).days + 1
+    # Punches of the following day can still close a shift that started on end_date
+    range_seconds = num_days * 86400 + attendance.shift_spill_seconds()
+    salary_table = attendance.get_salary_table()
+    unknown_departments = set()
+
+    employee_attendance = {}
+    for employee_row, punches in union_punches:
+        if departments and employee_row[4] not in departments:
+            continue
+        lo = bisect.bisect_left(punches, shift_seconds)
+        hi = bisect.bisect_left(punches, shift_seconds + range_seconds, lo)
+        range_punches = array('i', (punch - shift_seconds for punch in punches[lo:hi]))
+        if range_punches and attendance.has_range_punches(range_punches, num_days):
+            employee_attendance[employee_row[0]] = attendance.employee_record(
+                employee_row, range_punches, num_days, salary_table, unknown_departments)
+    return employee_attendance
+
+
+# Write one report per range (and per department, if given) from a single read of each database
+def run_batch(ranges, departments=None, filename_template=default_filename_template, engine=None, writer=None):
+    """
+    Returns: [(start_date, end_date, department, full_path)] for every report written;
+    department is None for reports covering every department
+    """
+    config = attendance.load_config()
+    engine = engine or config.get("engine", "python")
+    union_start = min(start for start, _ in ranges)
+    union_end = max(end for _, end in ranges)
+
+    print(f"Reading punches from {union_start} to {union_end}")
+    branch_punches = attendance.map_branches(
+        config, lambda branch_config: load_union_punches(branch_config, union_start, union_end))
+    print(f"Loaded {sum(len(punches) for _, union_punches in branch_punches for _, punches in union_punches)} "
+          f"punches for {sum(len(union_punches) for _, union_punches in branch_punches)} employees")
+
+    report_directory = config["report_directory"]
+    if not os.path.exists(report_directory):
+        os.makedirs(report_directory)
+
+    written = []
+    for start_date, end_date in ranges:
+        num_days = (_parse_date(end_date) - _parse_date(start_date)).days + 1
+        filename = filename_template.format(start=start_date, end=end_date)
+        for department in departments or [None]:
+            # Every branch database is sliced and classified on its own, then combined
+            branch_attendance = []
+            for branch, union_punches in branch_punches:
+                employee_attendance = slice_attendance(union_punches, union_start, start_date, end_date,
+                                                       [department] if department else None)
+                attendance.classify_and_release(employee_attendance, start_date, end_date, engine)
+                attendance.compute_payroll(employee_attendance, num_days)
+                branch_attendance.append((branch, employee_attendance))
+            employee_attendance = attendance.combine_branches(branch_attendance)
+
+            report_filename = attendance.department_filename(filename, department) if department else filename
+            full_path = attendance.generate_excel(report_filename, employee_attendance, start_date, end_date,
+                                                  open_file=False, writer=writer)
+            print(f"Report generated successfully: {full_path}")
+            written.append((start_date, end_date, department, full_path))
+    return written
+
+
+# ===============================================================
+# COMMAND LINE
+# ===============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate many attendance reports from one database read",
+        epilog="Examples:\n"
+               "  python batch_reports.py --from 2025-01-01 --to 2025-03-31 --period semi-monthly\n"
+               "  python batch_reports.py --range 2025-01-01:2025-01-15 --range 2025-01-16:2025-01-31\n"
+               "  python batch_reports.py --from 2024-01-01 --to 2024-12-31 --period monthly --department Cook",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--range", dest="ranges", action="append", type=parse_range, default=[],
+                        help="Report range as START:END (YYYY-MM-DD:YYYY-MM-DD); may be repeated")
+    parser.add_argument("--from", dest="period_from", type=_parse_date, help="First day of the pay periods")
+    parser.add_argument("--to", dest="period_to", type=_parse_date, help="Last day of the pay periods")
+    parser.add_argument("--period", choices=["semi-monthly", "monthly", "daily"], default="semi-monthly",
+                        help="Pay period used with --from/--to (default: semi-monthly)")
+    parser.add_argument("--department", dest="departments", action="append",
+                        help="Write a separate report for this department; may be repeated")
+    parser.add_argument("--filename", default=default_filename_template,
+                        help="Report filename template with {start} and {end} (default: %(default)s)")
+    parser.add_argument("--engine", choices=["python", "numpy"], help="Attendance engine (default: config.json)")
+    parser.add_argument("--writer", choices=sorted(attendance.report_writers),
+                        help="Report writer (default: config.json)")
+    parser.add_argument("--config", help="Use this config.json instead of the one in the current directory")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        attendance.config_file = args.config
+
+    ranges = list(args.ranges)
+    if args.period_from or args.period_to:
+        if not (args.period_from and args.period_to) or args.period_to < args.period_from:
+            parser.error("--from and --to must both be given, with --to on or after --from")
+        ranges += pay_periods(args.period_from, args.period_to, args.period)
+    if not ranges:
+        parser.error("give at least one --range or a --from/--to period")
+
+    try:
+        run_batch(ranges, args.departments, args.filename, args.engine, args.writer)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return 1
+    except (KeyError, ValueError) as e:
+        print(f"Invalid input: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Build a synthetic ZKBio Time.Net database for benchmarking.
+
+Usage:
+    python benchmarks/generate_timenet_db.py out.db --employees 200 --days 31
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import attendance
+
+# Tables and columns read by attendance.punch_query, with the extra columns ZKBio Time.Net keeps
+schema = """
+    CREATE TABLE hr_department (
+        id INTEGER PRIMARY KEY,
+        dept_code TEXT,
+        dept_name TEXT NOT NULL
+    );
+    CREATE TABLE hr_employee (
+        id INTEGER PRIMARY KEY,
+        emp_pin TEXT NOT NULL,
+        emp_firstname TEXT,
+        emp_lastname TEXT,
+        department_id INTEGER REFERENCES hr_department (id),
+        emp_privilege INTEGER NOT NULL DEFAULT 0,
+        emp_active INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE TABLE att_punches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER NOT NULL,
+        punch_time TEXT NOT NULL,
+        workcode TEXT,
+        terminal_id INTEGER
+    );
+"""
+
+first_names = ["Maria", "Jose", "Juan", "Ana", "Mark", "Grace", "Paolo", "Liza", "Ramon", "Joy", "Carlo", "Rose"]
+last_names = ["Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Torres", "Flores", "Ramos", "Aquino"]
+
+
+# ===============================================================
+# PUNCH SIMULATION
+# ===============================================================
+
+# Punches for one shift as seconds from the shift day's midnight, or [] when the employee skips it
+def simulate_shift(rng, window, absent_rate, late_rate, missing_out_rate, duplicate_rate):
+    shift_start, shift_late, shift_absent, shift_end, shift_latest_out = window
+    if rng.random() < absent_rate:
+        return []
+
+    if rng.random() < late_rate:
+        punch_in = rng.randint(shift_late, shift_absent - 1)
+    else:
+        punch_in = rng.randint(shift_start, shift_late - 1)
+    punches = [punch_in]
+
+    if rng.random() >= missing_out_rate:
+        punches.append(rng.randint(shift_end, min(shift_end + 3600, shift_latest_out)))
+
+    # Devices often record a second tap a few seconds after the first
+    for punch in list(punches):
+        if rng.random() < duplicate_rate:
+            punches.append(punch + rng.randint(1, 90))
+    return punches
+
+
+# Create and fill the database
+def generate_database(path, employees=200, days=31, start_date="2025-01-01", seed=0, absent_rate=0.05,
+                      late_rate=0.15, missing_out_rate=0.03, duplicate_rate=0.2, inactive_rate=0.02):
+    """
+    Returns: the number of punches written
+    Departments are taken from the configured department salaries so every employee has rates.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = random.Random(seed)
+    windows = attendance.shift_windows()
+    departments = list(attendance.get_salary_table()) or ["Cook"]
+    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+
+    with sqlite3.connect(path) as conn:
+        conn.executescript(schema)
+        conn.executemany("INSERT INTO hr_department (id, dept_code, dept_name) VALUES (?, ?, ?)",
+                         [(i, f"D{i:02d}", name) for i, name in enumerate(departments, 1)])
+
+        employee_rows = []
+        for emp_id in range(1, employees + 1):
+            employee_rows.append((emp_id, f"{emp_id:05d}", rng.choice(first_names), rng.choice(last_names),
+                                  rng.randint(1, len(departments)), 0, 0 if rng.random() < inactive_rate else 1))
+        conn.executemany("INSERT INTO hr_employee (id, emp_pin, emp_firstname, emp_lastname, department_id, "
+                         "emp_privilege, emp_active) VALUES (?, ?, ?, ?, ?, ?, ?)", employee_rows)
+
+        # Punches are inserted day by day in time order, as device syncs would add them
+        punch_count = 0
+        for day in range(days):
+            day_start = start_dt + datetime.timedelta(days=day)
+            day_punches = []
+            for emp_id in range(1, employees + 1):
+                for window in windows:
+                    for second in simulate_shift(rng, window, absent_rate, late_rate, missing_out_rate,
+                                                 duplicate_rate):
+                        day_punches.append((second, emp_id))
+            day_punches.sort()
+            conn.executemany("INSERT INTO att_punches (employee_id, punch_time, terminal_id) VALUES (?, ?, 1)",
+                             [(emp_id, (day_start + datetime.timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S"))
+                              for second, emp_id in day_punches])
+            punch_count += len(day_punches)
+
+    return punch_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic TimeNet.db")
+    parser.add_argument("path", help="Database file to create (overwritten if it exists)")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--start", default="2025-01-01", help="First punch date (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--absent-rate", type=float, default=0.05, help="Chance a shift has no punches")
+    parser.add_argument("--late-rate", type=float, default=0.15, help="Chance a shift starts in the late window")
+    parser.add_argument("--missing-out-rate", type=float, default=0.03, help="Chance a shift has no out punch")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="Chance a punch is tapped twice")
+    args = parser.parse_args(argv)
+
+    punch_count = generate_database(args.path, args.employees, args.days, args.start, args.seed,
+                                    args.absent_rate, args.late_rate, args.missing_out_rate, args.duplicate_rate)
+    print(f"Wrote {args.employees} employees and {punch_count} punches to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
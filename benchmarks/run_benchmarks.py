@@ -0,0 +1,286 @@
+"""
+Time each report stage on synthetic databases of several sizes.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 50x15,200x31,1000x31
+    python benchmarks/run_benchmarks.py --save-baseline
+
+Databases are generated once into benchmarks/data/ and reused. Results are written to
+benchmarks/latest.json and compared with benchmarks/baseline.json when it exists.
+Each run also checks that the "first_punches" query mode gives the same attendance as the raw query,
+that the numpy engine gives exactly the python engine's attendance, with the configured shifts and
+with a night shift, and records the memory held by the unclassified employee records of each size.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmark_dir))
+
+import attendance
+from generate_timenet_db import generate_database
+
+data_dir = os.path.join(benchmark_dir, "data")
+baseline_file = os.path.join(benchmark_dir, "baseline.json")
+latest_file = os.path.join(benchmark_dir, "latest.json")
+
+default_sizes = "50x15,200x31,1000x31"
+start_date = "2025-01-01"
+
+# Shifts for the engine check: the night shift's out punches fall on the next day, so they are
+# read past end_date and moved back to the previous day
+night_shifts = [
+    {"name": "Day", "start": "06:00", "late": "06:15", "absent": "07:00", "end": "14:00", "latest_out": "14:30"},
+    {"name": "Night", "start": "21:45", "late": "22:00", "absent": "23:00", "end": "05:30", "latest_out": "06:30"},
+]
+
+
+# ===============================================================
+# TIMING HELPERS
+# ===============================================================
+
+# Run func repeat times and keep the fastest wall time
+def best_time(func, repeat):
+    """Returns: (seconds, result of the last call)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# Parse "200x31" into (employees, days)
+def parse_size(size):
+    employees, days = size.lower().split("x")
+    return int(employees), int(days)
+
+
+# Generate the database for a size unless it was already built with the same seed
+def database_for(employees, days, seed):
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"timenet_{employees}x{days}_s{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {path}")
+        generate_database(path, employees, days, start_date, seed)
+    return path
+
+
+# ===============================================================
+# STAGES
+# ===============================================================
+
+# Run the report query and group its rows, without classifying
+def run_query(db_path, end_date, query_mode="raw"):
+    """Returns: {emp_id: punches} as passed to attendance.classify_employees"""
+    with attendance.connect_punch_source({}, db_path) as conn:
+        return {employee_row[0]: punches
+                for employee_row, punches in attendance.query_employee_punches(conn, start_date, end_date,
+                                                                               query_mode)}
+
+
+# Memory held by unclassified employee records for the whole range, and the peak while reading them
+def measure_records_memory(db_path, end_date):
+    """Returns: (records MB, peak MB), both measured with tracemalloc"""
+    num_days = (datetime.date.fromisoformat(end_date) - datetime.date.fromisoformat(start_date)).days + 1
+    salary_table = attendance.get_salary_table()
+    tracemalloc.start()
+    try:
+        with attendance.connect_punch_source({}, db_path) as conn:
+            started = tracemalloc.get_traced_memory()[0]
+            records = {
+                employee_row[0]: attendance.employee_record(employee_row, punches, num_days, salary_table, set())
+                for employee_row, punches in attendance.query_employee_punches(conn, start_date, end_date)
+            }
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del records
+    return round((current - started) / 1048576, 2), round((peak - started) / 1048576, 2)
+
+
+# Classify already loaded punches
+def run_classify(records, end_date, engine):
+    return attendance.classify_employees(records, start_date, end_date, engine)
+
+
+# Query and classify in one pass, as generate_report does
+def run_load(db_path, end_date, engine):
+    config = {"db_path": db_path, "engine": engine}
+    return attendance.load_employee_attendance(config, start_date, end_date, engine)
+
+
+# Check that the aggregated query gives the same attendance as the raw punches
+def check_first_punches(records, first_records, end_date):
+    """Raises AssertionError naming the first employee whose attendance differs"""
+    expected = attendance.classify_employees(records, start_date, end_date)
+    actual = attendance.classify_employees(first_records, start_date, end_date)
+    if expected.keys() != actual.keys():
+        raise AssertionError("first_punches returned a different set of employees")
+    for emp_id, status in expected.items():
+        if actual[emp_id] != status:
+            raise AssertionError(f"first_punches attendance differs for employee {emp_id}")
+
+
+# Check that the numpy engine gives exactly the python engine's attendance
+def check_engines(records, end_date):
+    """Raises AssertionError naming the first employee whose attendance differs"""
+    expected = attendance.classify_employees(records, start_date, end_date, "python")
+    actual = attendance.classify_employees(records, start_date, end_date, "numpy")
+    if expected.keys() != actual.keys():
+        raise AssertionError("the numpy engine returned a different set of employees")
+    for emp_id, status in expected.items():
+        if actual[emp_id] != status:
+            raise AssertionError(f"numpy engine attendance differs for employee {emp_id}")
+
+
+# Run check_engines with night_shifts in place of the configured shifts
+def check_engines_night_shift(db_path, end_date):
+    config = dict(attendance.load_config(), shifts=night_shifts)
+    config_dir = tempfile.mkdtemp(prefix="biotime_bench_")
+    saved_config_file = attendance.config_file
+    try:
+        attendance.config_file = os.path.join(config_dir, "config.json")
+        with open(attendance.config_file, "w") as f:
+            json.dump(config, f)
+        check_engines(run_query(db_path, end_date), end_date)
+    finally:
+        attendance.config_file = saved_config_file
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+def run_write(writer, output_dir, employee_attendance, end_date):
+    write_report, extension = attendance.report_writers[writer]
+    write_report(os.path.join(output_dir, "benchmark" + extension), employee_attendance, start_date, end_date)
+
+
+# Time every stage for one database size
+def benchmark_size(employees, days, seed, engines, writers, repeat):
+    """Returns: {"employees", "days", "punches", "records_mb", "read_peak_mb", "<stage>": seconds, ...}"""
+    db_path = database_for(employees, days, seed)
+    end_date = (datetime.date.fromisoformat(start_date) + datetime.timedelta(days=days - 1)).isoformat()
+    with sqlite3.connect(db_path) as conn:
+        punch_count = conn.execute("SELECT COUNT(*) FROM att_punches").fetchone()[0]
+
+    result = {"employees": employees, "days": days, "punches": punch_count}
+    result["records_mb"], result["read_peak_mb"] = measure_records_memory(db_path, end_date)
+    result["query"], records = best_time(lambda: run_query(db_path, end_date), repeat)
+    result["query_first_punches"], first_records = best_time(
+        lambda: run_query(db_path, end_date, "first_punches"), repeat)
+    check_first_punches(records, first_records, end_date)
+    if "numpy" in engines:
+        check_engines(records, end_date)
+        check_engines_night_shift(db_path, end_date)
+
+    employee_attendance = None
+    for engine in engines:
+        result[f"classify_{engine}"], _ = best_time(lambda: run_classify(records, end_date, engine), repeat)
+        result[f"load_{engine}"], employee_attendance = best_time(lambda: run_load(db_path, end_date, engine),
+                                                                  repeat)
+
+    output_dir = tempfile.mkdtemp(prefix="biotime_bench_")
+    try:
+        for writer in writers:
+            result[f"write_{writer}"], _ = best_time(
+                lambda: run_write(writer, output_dir, employee_attendance, end_date), repeat)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return result
+
+
+# ===============================================================
+# BASELINE COMPARISON
+# ===============================================================
+
+# Print each stage next to the baseline and return the stages slower than threshold times the baseline
+def compare_results(results, baseline, threshold):
+    regressions = []
+    for size, stages in results.items():
+        baseline_stages = baseline.get(size, {})
+        print(f"\n{size} ({stages['punches']} punches)")
+        print(f"    {'memory':<18} records {stages['records_mb']:.2f} MB, peak while reading "
+              f"{stages['read_peak_mb']:.2f} MB")
+        for stage, seconds in stages.items():
+            if stage in ("employees", "days", "punches") or stage.endswith("_mb"):
+                continue
+            previous = baseline_stages.get(stage)
+            if previous:
+                ratio = seconds / previous
+                flag = "  REGRESSION" if ratio > threshold else ""
+                print(f"    {stage:<18} {seconds:8.3f}s  baseline {previous:8.3f}s  x{ratio:.2f}{flag}")
+                if flag:
+                    regressions.append(f"{size} {stage}")
+            else:
+                print(f"    {stage:<18} {seconds:8.3f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark report stages on synthetic databases")
+    parser.add_argument("--sizes", default=default_sizes, help="Comma-separated EMPLOYEESxDAYS sizes")
+    parser.add_argument("--engines", default="python,numpy", help="Comma-separated attendance engines")
+    parser.add_argument("--writers", default=",".join(attendance.report_writers),
+                        help="Comma-separated report writers")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=latest_file, help="Where to write this run's results")
+    parser.add_argument("--baseline", default=baseline_file, help="Baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Flag stages slower than this multiple of the baseline")
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(",")
+    if "numpy" in engines:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            print("NumPy is not installed, skipping the numpy engine")
+            engines.remove("numpy")
+
+    results = {}
+    for size in args.sizes.split(","):
+        employees, days = parse_size(size)
+        print(f"Benchmarking {employees} employees x {days} days")
+        results[f"{employees}x{days}"] = benchmark_size(employees, days, args.seed, engines,
+                                                        args.writers.split(","), args.repeat)
+
+    run = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(run, f, indent=4)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare_results(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"\nBaseline saved to {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) slower than x{args.threshold} the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+import argparse
+import datetime
+import sqlite3
+
+import attendance
+import timenet_db
+
+punch_index_name = "idx_att_punches_employee_punch_time"
+punch_index_columns = ["employee_id", "punch_time"]
+
+
+# ===============================================================
+# INDEX INSPECTION
+# ===============================================================
+
+# Find an index on att_punches whose leading columns are (employee_id, punch_time)
+def find_punch_index(conn):
+    """Return the name of a suitable index, or None if att_punches has none"""
+    for row in conn.execute("PRAGMA index_list('att_punches')"):
+        index_name = row[1]
+        columns = [info[2] for info in conn.execute(f"PRAGMA index_info('{index_name}')")]
+        if columns[:len(punch_index_columns)] == punch_index_columns:
+            return index_name
+    return None
+
+
+# Return the EXPLAIN QUERY PLAN lines for the report query
+def explain_punch_query(conn, start_date, end_date):
+    rows = conn.execute("EXPLAIN QUERY PLAN " + attendance.punch_query,
+                        attendance.punch_query_params(start_date, end_date)).fetchall()
+    return [row[-1] for row in rows]
+
+
+def print_query_plan(title, plan):
+    print(title)
+    for line in plan:
+        print(f"    {line}")
+
+
+# ===============================================================
+# INDEX PROVISIONING
+# ===============================================================
+
+# Copy a database with the SQLite backup API so a live ZKBio Time.Net database stays consistent
+def copy_database(db_path, copy_path):
+    source = timenet_db.connect_readonly(db_path)
+    try:
+        with sqlite3.connect(copy_path) as target:
+            timenet_db.with_lock_retry(lambda: source.backup(target))
+    finally:
+        source.close()
+
+
+# Check for the punch index and create it on a copy or, with permission, in place
+def ensure_punch_index(db_path, start_date, end_date, copy_path=None, assume_yes=False):
+    """
+    Report the query plan before and after creating the (employee_id, punch_time) index.
+    With copy_path the index is built on a copy of db_path and the original is left untouched.
+    Returns: the name of the index in use, or None if it was not created
+    """
+    target_path = db_path
+    if copy_path:
+        copy_database(db_path, copy_path)
+        target_path = copy_path
+        print(f"Working on copy: {copy_path}")
+
+    # A mistyped --db path is an error instead of a new empty database
+    with sqlite3.connect(timenet_db.readwrite_uri(target_path), uri=True) as conn:
+        print_query_plan("Query plan before:", explain_punch_query(conn, start_date, end_date))
+
+        index_name = find_punch_index(conn)
+        if index_name:
+            print(f"Suitable index already exists: {index_name}")
+            return index_name
+
+        if not copy_path and not assume_yes:
+            answer = input(f"Create index {punch_index_name} on {db_path}? [y/N] ")
+            if answer.strip().lower() not in ("y", "yes"):
+                print("Index not created.")
+                return None
+
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {punch_index_name} "
+                     f"ON att_punches ({', '.join(punch_index_columns)})")
+        conn.execute("ANALYZE att_punches")
+        print(f"Created index: {punch_index_name}")
+
+        print_query_plan("Query plan after:", explain_punch_query(conn, start_date, end_date))
+        return punch_index_name
+
+
+# ===============================================================
+# COMMAND LINE
+# ===============================================================
+
+def main(argv=None):
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="Check and provision the att_punches index used by reports")
+    parser.add_argument("--db", help="Path to TimeNet.db (defaults to db_path in config.json)")
+    parser.add_argument("--copy", help="Build the index on a copy written to this path instead of in place")
+    parser.add_argument("--yes", action="store_true", help="Create the index in place without asking")
+    parser.add_argument("--start", default=today.replace(day=1).isoformat(),
+                        help="Start date used for EXPLAIN QUERY PLAN (YYYY-MM-DD)")
+    parser.add_argument("--end", default=today.isoformat(), help="End date used for EXPLAIN QUERY PLAN (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or attendance.load_config()["db_path"]
+    try:
+        ensure_punch_index(db_path, args.start, args.end, copy_path=args.copy, assume_yes=args.yes)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+import bisect
+import datetime
+from contextlib import closing
+
+import attendance
+import timenet_db
+
+# Active, non-privileged employees with their department, as in the report query
+roster_select = """
+    SELECT em.id, em.emp_firstname, em.emp_lastname, dep.dept_name
+    FROM hr_employee em
+    INNER JOIN hr_department dep ON em.department_id = dep.id
+    WHERE (em.emp_privilege=0) AND (em.emp_active=1)
+"""
+roster_query = roster_select + " ORDER BY em.id"
+employee_query = roster_select + " AND em.id = ?"
+
+# Punches with ids in (after_id, up_to_id] inside [day start, day end); id is the rowid, so
+# polling with after_id = last seen id only visits the rows added since
+punch_rows_query = """
+    SELECT id, employee_id,
+           (strftime('%s', punch_time) - ?) / 86400 AS day_offset,
+           (strftime('%s', punch_time) - ?) % 86400 AS second_of_day
+    FROM att_punches
+    WHERE id > ? AND id <= ? AND punch_time >= ? AND punch_time < ?
+    ORDER BY id
+"""
+
+# Shown for a shift without any punch yet
+no_punch_status = "—"
+
+
+# ===============================================================
+# LIVE STATE
+# ===============================================================
+
+# Today's per-employee shift state, updated from new att_punches rows only
+class LiveAttendance:
+    """
+    The live day is the day the current shift started, so a night shift stays on screen
+    after midnight. When it changes, the roster and that day's punches are loaded once;
+    every later poll reads only punches with an id above the highest id seen.
+    The shift rules are kept from that load, and the day is loaded again when they change.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.shift_day = None
+        self.rules = None
+        self.last_id = 0
+        self.employees = {}
+
+    # The day whose shifts are shown at now: yesterday during the after-midnight part of a night shift
+    @staticmethod
+    def live_day(now):
+        entry = attendance.shift_rules()[2][now.hour * 60 + now.minute]
+        day_adjust = entry[2] if entry else 0
+        return now.date() + datetime.timedelta(days=day_adjust)
+
+    # Name of the shift whose window contains now, or None between shifts
+    def current_shift_name(self, now):
+        names, _, table = self.rules
+        entry = table[now.hour * 60 + now.minute]
+        return names[entry[0]] if entry else None
+
+    # Names of the shifts in each row's statuses
+    def shift_names(self):
+        return self.rules[0]
+
+    def _query_params(self, after_id, up_to_id):
+        day_start = datetime.datetime.combine(self.shift_day, datetime.time())
+        day_end = day_start + datetime.timedelta(days=1, seconds=attendance.shift_spill_seconds())
+        day_epoch = int((day_start - datetime.datetime(1970, 1, 1)).total_seconds())
+        return (day_epoch, day_epoch, after_id, up_to_id, day_start.strftime("%Y-%m-%d"),
+                day_end.strftime("%Y-%m-%d %H:%M:%S"))
+
+    def _add_employee(self, emp_id, first_name, last_name, dept_name):
+        self.employees[emp_id] = {
+            "name": f"{last_name}, {first_name}",
+            "dept_name": dept_name,
+            "shifts": [[] for _ in self.rules[1]],
+            "last_punch": None,
+        }
+
+    # Reload the roster and every punch of a new live day, or of the same day under new shift rules
+    def _reset(self, conn, shift_day, rules):
+        self.shift_day = shift_day
+        self.rules = rules
+        self.employees = {}
+        for emp_id, first_name, last_name, dept_name in conn.execute(roster_query):
+            self._add_employee(emp_id, first_name, last_name, dept_name)
+
+        # Bound the day's load by the current max id so the next poll continues exactly after it
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM att_punches").fetchone()[0]
+        self._apply(conn, conn.execute(punch_rows_query, self._query_params(0, max_id)).fetchall())
+        self.last_id = max_id
+
+    # Add punch rows to the state and return the ids of the employees they changed
+    def _apply(self, conn, rows):
+        _, _, table = self.rules
+        changed = set()
+        for punch_id, emp_id, day_offset, second_of_day in rows:
+            self.last_id = max(self.last_id, punch_id)
+            employee = self.employees.get(emp_id)
+            if employee is None:
+                # Employees added after the roster was loaded
+                roster_row = conn.execute(employee_query, (emp_id,)).fetchone()
+                if roster_row is None:
+                    continue
+                self._add_employee(*roster_row)
+                employee = self.employees[emp_id]
+
+            entry = table[second_of_day // 60]
+            if entry is None or entry[1] == attendance.role_none or day_offset + entry[2] != 0:
+                continue
+            shift_index, role, day_adjust = entry
+            shift_second = second_of_day - day_adjust * 86400
+
+            # Punches synced late can arrive out of time order
+            bisect.insort(employee["shifts"][shift_index], (shift_second << 2) | role)
+            employee["last_punch"] = max(employee["last_punch"] or 0, shift_second)
+            changed.add(emp_id)
+        return changed
+
+    # Read new punches and return rows for the employees whose state changed
+    def poll(self, now=None):
+        """
+        Returns: (reset, rows) where reset is True when the live day or the shift rules changed and
+        rows then covers every employee; otherwise rows covers only employees with new punches.
+        Each row is (emp_id, name, dept_name, [status per shift], last punch "HH:MM" or "").
+        """
+        now = now or datetime.datetime.now()
+        shift_day = self.live_day(now)
+        rules = attendance.shift_rules()
+        with closing(timenet_db.with_lock_retry(lambda: timenet_db.connect_readonly(self.db_path))) as conn:
+            # Names and windows determine the minute table, so comparing them is enough
+            if shift_day != self.shift_day or self.rules is None or rules[:2] != self.rules[:2]:
+                timenet_db.with_lock_retry(lambda: self._reset(conn, shift_day, rules))
+                return True, [self.row(emp_id) for emp_id in self.employees]
+
+            max_id = self.last_id
+            rows = timenet_db.with_lock_retry(
+                lambda: conn.execute(punch_rows_query, self._query_params(max_id, 2 ** 63 - 1)).fetchall())
+            changed = self._apply(conn, rows)
+        return False, [self.row(emp_id) for emp_id in sorted(changed)]
+
+    def row(self, emp_id):
+        employee = self.employees[emp_id]
+        statuses = [live_status(codes, window)
+                    for codes, window in zip(employee["shifts"], self.rules[1])]
+        last_punch = ""
+        if employee["last_punch"] is not None:
+            hours, seconds = divmod(employee["last_punch"] % 86400, 3600)
+            last_punch = f"{hours:02d}:{seconds // 60:02d}"
+        return emp_id, employee["name"], employee["dept_name"], statuses, last_punch
+
+
+# Status of one shift so far, using the report's shift rules
+def live_status(shift_codes, window):
+    """
+    Returns: the report symbol once the shift has an in and an out punch ('✓', or '#' with the
+    late minutes), "In" / "In (late Nm)" while only the in punch is recorded, '✕' for an out
+    punch without an in punch, and no_punch_status before any punch
+    """
+    if not shift_codes:
+        return no_punch_status
+
+    status, late_minutes = attendance.classify_shift(shift_codes, window)
+    if status == '#':
+        return f"# ({late_minutes}m)"
+    if status == '✓':
+        return status
+
+    punch_in = next((code for code in shift_codes if code & 3 != attendance.role_out), None)
+    if punch_in is None:
+        return status
+    if punch_in & 3 == attendance.role_late:
+        return f"In (late {((punch_in >> 2) - window[1]) // 60}m)"
+    return "In"
@@ -1,12 +1,24 @@
+import startup_timing
+
+# Import timing must be installed before the other imports so they are measured too
+startup_timing.install()
+
 import tkinter as tk
-import attendance
+import punch_cache
+import report_prefetch
 import re
 import json
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import os
 import datetime
+import queue
+import threading
+import time
+import multiprocessing
 from tkcalendar import DateEntry
 
+startup_timing.mark("main_app imports done")
+
 config_file = "config.json"
 
 default_config = {
@@ -14,6 +26,25 @@ default_config = {
     "report_directory": r"C:\Users\Public\Documents",
     "daily_salary": float(410.0),
     "deduction_per_minute": float(0.85),
+    "engine": "python",
+    "excel_write_only": True,
+    "use_punch_cache": False,
+    "workers": 1,
+    "per_department_workbooks": False,
+    "report_writer": "openpyxl",
+    "query_mode": "raw",
+    "reuse_reports": True,
+    "prefetch_reports": True,
+    "prefetch_max_days": report_prefetch.default_prefetch_max_days,
+    "branches": [],
+    "per_branch_sheets": False,
+    "shifts": [
+        {"name": "AM", "start": "07:30", "late": "09:30", "absent": "10:00", "end": "14:00", "latest_out": "15:00"},
+        {"name": "PM", "start": "15:01", "late": "16:00", "absent": "16:31", "end": "21:00", "latest_out": "23:59"}
+    ],
+    "live_refresh_seconds": 5,
+    "timing_log": "report_timings.jsonl",
+    "trace_memory": False,
     "department_salaries": {
         "Dining 1": 12750.0,
         "Dining 2": 12300.0,
@@ -31,6 +62,19 @@ default_config = {
 }
 
 
+# Progress messages for each stage in attendance.report_stages, in the same order; kept here so the
+# window can be built before attendance (and openpyxl) is imported
+report_stage_labels = {
+    "query": "Reading punches from the database...",
+    "classify": "Checking attendance...",
+    "write": "Writing report sheets...",
+    "save": "Saving workbook..."
+}
+
+# How long the dates must stay unchanged before the selected range is prefetched
+prefetch_delay_ms = 700
+
+
 # Load configuration
 def load_config():
     try:
@@ -40,6 +84,13 @@ def load_config():
         return default_config
 
 
+# Import the report modules; the first import of attendance also loads openpyxl
+def load_report_modules():
+    import attendance
+    import report_timing
+    return attendance, report_timing
+
+
 # Save configuration
 def save_config(config):
     with open(config_file, "w") as f:
@@ -64,7 +115,7 @@ class Application(tk.Tk):
 
         # Create frames for different screens
         self.frames = {}
-        for F in (MainScreen, SettingsScreen):
+        for F in (MainScreen, SettingsScreen, LiveScreen):
             frame = F(self.container, self)
             self.frames[F] = frame
             frame.grid(row=0, column=0, sticky="nsew")
@@ -80,10 +131,32 @@ class Application(tk.Tk):
         self.start_date = None
         self.end_date = None
 
+        # Preload the report modules once the window is up so the first report starts quickly
+        self.after(0, self.preload_report_modules)
+
+    def preload_report_modules(self):
+        startup_timing.mark("window shown")
+        threading.Thread(target=self._preload_report_modules, daemon=True).start()
+
+    @staticmethod
+    def _preload_report_modules():
+        """Background thread: a report started meanwhile waits on the import lock instead of importing twice"""
+        try:
+            load_report_modules()
+        except ImportError as e:
+            print(f"Could not preload report modules: {e}")
+        startup_timing.mark("report modules preloaded")
+        startup_timing.write_report(os.path.dirname(os.path.abspath(config_file)))
+
     def show_frame(self, frame_class):
-        """Raise the specified frame to the top"""
+        """Raise the specified frame to the top, telling screens with on_show/on_hide about the switch"""
         frame = self.frames[frame_class]
+        for other in self.frames.values():
+            if other is not frame and hasattr(other, "on_hide"):
+                other.on_hide()
         frame.tkraise()
+        if hasattr(frame, "on_show"):
+            frame.on_show()
 
 
 class MainScreen(tk.Frame):
@@ -104,6 +177,12 @@ class MainScreen(tk.Frame):
                                     relief=tk.FLAT, cursor="hand2", bg="#FFFDF0", fg="#A31D1D")
         settings_button.place(relx=0.98, rely=0.02, anchor="ne")
 
+        # Live view button (top left) - who has clocked in today
+        live_button = tk.Button(self, text="Today", font=('Segoe UI', 12),
+                                command=lambda: controller.show_frame(LiveScreen),
+                                relief=tk.FLAT, cursor="hand2", bg="#FFFDF0", fg="#A31D1D")
+        live_button.place(relx=0.02, rely=0.03, anchor="nw")
+
         # Top section - Instructions
         instructions_text = "Before generating reports, ensure you have the latest attendance data.\nRetrieve new transactions from ZKBio Time.Net software before continuing.\n \nSteps:\nOpen ZKBio Time.Net software > Go to Device (Main Section) >\nSelect Device (Subsection) > Click 'Get Transactions'"
         instructions_label = tk.Label(content_frame, text=instructions_text, font=('Segoe UI', 12),
@@ -128,6 +207,13 @@ class MainScreen(tk.Frame):
                                         headersforeground="#6D2323", selectbackground="#A31D1D")
         self.end_date_entry.grid(row=0, column=3, padx=(0, 0))
 
+        # Load the selected range in the background once the dates stop changing
+        self.prefetcher = report_prefetch.ReportPrefetcher()
+        self.prefetch_after_id = None
+        for date_entry in (self.start_date_entry, self.end_date_entry):
+            date_entry.bind("<<DateEntrySelected>>", self.schedule_prefetch)
+            date_entry.bind("<KeyRelease>", self.schedule_prefetch)
+
         # Bottom section - Excel File Name Entry
         file_frame = tk.Frame(content_frame, bg="#FFFDF0")
         file_frame.pack(pady=20)
@@ -156,13 +242,72 @@ class MainScreen(tk.Frame):
 
         self.filename_entry.pack(pady=(0, 10))
 
+        # Progress section - shown while a report is being generated
+        progress_frame = tk.Frame(self, bg="#FFFDF0")
+        progress_frame.place(relx=0.5, rely=0.86, anchor="s")
+
+        self.progress_label = tk.Label(progress_frame, text="", font=('Segoe UI', 10), bg="#FFFDF0")
+        self.progress_label.pack()
+        self.progress_bar = ttk.Progressbar(progress_frame, length=400, mode="determinate",
+                                            maximum=len(report_stage_labels))
+        self.progress_bar.pack(pady=(2, 0))
+
         # Generate Report button
-        generate_button = tk.Button(self, text="Generate Report", font=('Segoe UI', 13),
-                                    command=self.generate_report, bg="#6D2323", fg="white",
-                                    cursor="hand2", pady=2, width=20, relief=tk.RAISED)
-        generate_button.place(relx=0.5, rely=0.96, anchor="s")
+        self.generate_button = tk.Button(self, text="Generate Report", font=('Segoe UI', 13),
+                                         command=self.generate_report, bg="#6D2323", fg="white",
+                                         cursor="hand2", pady=2, width=20, relief=tk.RAISED)
+        self.generate_button.place(relx=0.5, rely=0.96, anchor="s")
+
+        # Cancel button - only enabled while a report is running
+        self.cancel_button = tk.Button(self, text="Cancel", font=('Segoe UI', 11), command=self.cancel_report,
+                                       cursor="hand2", relief=tk.RIDGE, bg="snow2", width=10, state=tk.DISABLED)
+        self.cancel_button.place(relx=0.85, rely=0.96, anchor="s")
+
+        # Profile checkbox - saves a cProfile dump next to the report for the next run only
+        self.profile_var = tk.BooleanVar(value=False)
+        profile_checkbox = tk.Checkbutton(self, text="Profile this run", variable=self.profile_var,
+                                          font=('Segoe UI', 10), bg="#FFFDF0", activebackground="#FFFDF0")
+        profile_checkbox.place(relx=0.15, rely=0.96, anchor="s")
+
+        # Background report worker state; results come back through report_queue
+        self.report_queue = queue.Queue()
+        self.report_thread = None
+        self.cancel_event = None
+
+    def schedule_prefetch(self, event=None):
+        """Restart the prefetch delay on every date change"""
+        if self.prefetch_after_id is not None:
+            self.after_cancel(self.prefetch_after_id)
+        self.prefetch_after_id = self.after(prefetch_delay_ms, self.start_prefetch)
+
+    def start_prefetch(self):
+        """Prefetch the selected range, or cancel the prefetch when the dates are not a valid range"""
+        self.prefetch_after_id = None
+        config = load_config()
+        if not config.get("prefetch_reports", True):
+            self.prefetcher.cancel()
+            return
+
+        start_date_str = self.start_date_entry.get()
+        end_date_str = self.end_date_entry.get()
+        try:
+            start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d").date()
+            end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d").date()
+        except ValueError:
+            self.prefetcher.cancel()
+            return
+        if end_date < start_date:
+            self.prefetcher.cancel()
+            return
+
+        self.prefetcher.max_days = config.get("prefetch_max_days", report_prefetch.default_prefetch_max_days)
+        self.prefetcher.request(start_date_str, end_date_str, (end_date - start_date).days + 1)
 
     def generate_report(self):
+        # Ignore clicks while a report is already running
+        if self.report_thread is not None and self.report_thread.is_alive():
+            return
+
         start_date_str = self.start_date_entry.get()
         end_date_str = self.end_date_entry.get()
         filename = self.filename_entry.get().strip()
@@ -181,11 +326,7 @@ class MainScreen(tk.Frame):
                         messagebox.showerror("Invalid Filename", "The filename must end with '.xlsx'.")
                         return
 
-                    try:
-                        attendance.process_dates(start_date_str, end_date_str, filename)
-                        messagebox.showinfo("Report Generated", "Report generated successfully!")
-                    except Exception as e:
-                        messagebox.showerror("Error", f"Failed to generate report: {e}")
+                    self.start_report(start_date_str, end_date_str, filename)
                 else:
                     messagebox.showerror("Error", "Please enter a valid filename.")
 
@@ -194,6 +335,98 @@ class MainScreen(tk.Frame):
         else:
             messagebox.showerror("Invalid Date", "Please enter dates in the format YYYY-MM-DD.")
 
+    def start_report(self, start_date_str, end_date_str, filename):
+        """Run the report on a background thread so the window stays responsive"""
+        profile = self.profile_var.get()
+        self.profile_var.set(False)
+
+        self.cancel_event = threading.Event()
+        self.report_thread = threading.Thread(target=self.run_report,
+                                              args=(start_date_str, end_date_str, filename, self.cancel_event,
+                                                    profile),
+                                              daemon=True)
+        self.generate_button.config(state=tk.DISABLED, cursor="arrow")
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress_bar["value"] = 0
+        self.progress_label.config(text="Starting...")
+        self.report_thread.start()
+        self.after(100, self.poll_report_queue)
+
+    def run_report(self, start_date_str, end_date_str, filename, cancel_event, profile):
+        """Worker thread: never touches Tk widgets, only posts messages to report_queue"""
+        def progress(stage):
+            self.report_queue.put(("progress", stage))
+
+        try:
+            attendance, report_timing = load_report_modules()
+        except ImportError as e:
+            self.report_queue.put(("error", e))
+            return
+
+        try:
+            config = attendance.load_config()
+            profile_path = None
+            if profile:
+                profile_path = os.path.join(config["report_directory"], os.path.splitext(filename)[0] + ".prof")
+
+            # A prefetch of this range, finished or still loading, leaves only the write stages to run
+            prefetched = self.prefetcher.take(start_date_str, end_date_str, cancel_event)
+            # take returns None when Cancel was pressed during the wait, so stop before loading anything
+            attendance.check_cancelled(cancel_event)
+            timer = report_timing.ReportTimer(config.get("trace_memory", False))
+            full_path = attendance.generate_report(start_date_str, end_date_str, filename,
+                                                   progress=progress, cancel_event=cancel_event,
+                                                   timer=timer, profile_path=profile_path, prefetched=prefetched)
+            self.report_queue.put(("done", (full_path, timer)))
+        except attendance.ReportCancelled:
+            self.report_queue.put(("cancelled", None))
+        except Exception as e:
+            self.report_queue.put(("error", e))
+
+    def poll_report_queue(self):
+        """Apply worker messages on the Tk main thread"""
+        stages = list(report_stage_labels)
+        while True:
+            try:
+                kind, payload = self.report_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                stage_number = stages.index(payload) + 1
+                self.progress_bar["value"] = stage_number - 1
+                self.progress_label.config(text=f"Step {stage_number} of {len(stages)}: "
+                                                f"{report_stage_labels[payload]}")
+                continue
+
+            self.finish_report()
+            if kind == "done":
+                full_path, timer = payload
+                self.progress_bar["value"] = len(stages)
+                self.progress_label.config(text=f"Report generated in {timer.total_seconds:.1f}s.")
+                messagebox.showinfo("Report Generated", f"Report generated successfully!\n{full_path}\n\n"
+                                                        f"{timer.summary_text()}")
+            elif kind == "cancelled":
+                self.progress_label.config(text="Report cancelled.")
+            else:
+                self.progress_label.config(text="Report failed.")
+                messagebox.showerror("Error", f"Failed to generate report: {payload}")
+            return
+
+        self.after(100, self.poll_report_queue)
+
+    def cancel_report(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.progress_label.config(text="Cancelling...")
+
+    def finish_report(self):
+        self.report_thread = None
+        self.cancel_event = None
+        self.generate_button.config(state=tk.NORMAL, cursor="hand2")
+        self.cancel_button.config(state=tk.DISABLED)
+
     def validate_date(self, date_str):
         # Check if the date matches the YYYY-MM-DD format using regex
         date_pattern = r"^\d{4}-\d{2}-\d{2}$"
@@ -286,6 +519,30 @@ class SettingsScreen(tk.Frame):
         tk.Button(db_path_frame, text="Browse Path", command=browse_db_path, cursor="hand2",
                   relief=tk.RIDGE, bg="snow2", width=14).pack(pady=5, anchor="w")
 
+        # Local punch cache
+        cache_frame = tk.Frame(settings_frame, bg="#FFFDF0")
+        cache_frame.pack(anchor="w", pady=5)
+
+        tk.Label(cache_frame, text="Punch Cache:", font=('Segoe UI', 11, "bold"),
+                 anchor="w", bg="#FFFDF0").pack(anchor="w")
+
+        use_cache_var = tk.BooleanVar(value=config.get("use_punch_cache", False))
+        tk.Checkbutton(cache_frame, text="Keep a local copy of punches and only fetch new ones",
+                       variable=use_cache_var, font=('Segoe UI', 10), bg="#FFFDF0",
+                       activebackground="#FFFDF0").pack(anchor="w")
+
+        def rebuild_punch_cache():
+            try:
+                current_config = load_config()
+                cache_path = punch_cache.cache_path_for(current_config, config_file)
+                punch_cache.rebuild_cache(db_path_entry.get(), cache_path)
+                messagebox.showinfo("Punch Cache", "Punch cache rebuilt successfully!")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to rebuild punch cache: {e}")
+
+        tk.Button(cache_frame, text="Rebuild Cache", command=rebuild_punch_cache, cursor="hand2",
+                  relief=tk.RIDGE, bg="snow2", width=14).pack(pady=5, anchor="w")
+
         # Department salaries
         dept_salary_frame = tk.Frame(settings_frame, bg="#FFFDF0")
         dept_salary_frame.pack(anchor="w", pady=5)
@@ -325,12 +582,15 @@ class SettingsScreen(tk.Frame):
 
         def save():
             try:
-                config = {
+                # Keep settings that have no field on this screen (e.g. "engine")
+                config = load_config()
+                config.update({
                     "db_path": db_path_entry.get(),
                     "report_directory": report_directory_entry.get(),
+                    "use_punch_cache": use_cache_var.get(),
                     "department_salaries": {dept: float(entry.get()) for dept, entry in
                                             self.dept_salary_entries.items()}
-                }
+                })
                 save_config(config)
                 controller.show_frame(MainScreen)  # Return to main screen after saving
             except ValueError as e:
@@ -348,7 +608,127 @@ class SettingsScreen(tk.Frame):
         self.bind("<Destroy>", _on_frame_leave)
 
 
+class LiveScreen(tk.Frame):
+    """Today's shift statuses, refreshed from new punches only while this screen is shown"""
+
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.configure(bg="#FFFDF0")
+
+        # Back button (top left)
+        back_button = tk.Button(self, text="⬅️", font=('Segoe UI', 20),
+                                command=lambda: controller.show_frame(MainScreen),
+                                relief=tk.FLAT, cursor="hand2", bg="#FFFDF0", fg="#A31D1D")
+        back_button.place(relx=0.02, rely=0.02, anchor="nw")
+
+        # Page label
+        page_label = tk.Label(self, text="Today", font=('Segoe UI', 18, "bold"), relief=tk.FLAT,
+                              bg="#FFFDF0", fg="#A31D1D")
+        page_label.place(relx=0.5, rely=0.02, anchor="n")
+
+        self.summary_label = tk.Label(self, text="", font=('Segoe UI', 10), bg="#FFFDF0")
+        self.summary_label.place(relx=0.5, rely=0.11, anchor="n")
+
+        # Employee table, one status column per shift; columns are set up on the first refresh
+        table_frame = tk.Frame(self, bg="#FFFDF0")
+        table_frame.place(relx=0.5, rely=0.17, anchor="n", relwidth=0.95, relheight=0.8)
+        self.table = ttk.Treeview(table_frame, show="headings")
+        table_scrollbar = tk.Scrollbar(table_frame, orient="vertical", command=self.table.yview)
+        self.table.configure(yscrollcommand=table_scrollbar.set)
+        table_scrollbar.pack(side="right", fill="y")
+        self.table.pack(side="left", fill="both", expand=True)
+
+        # Polling state; the tracker is only touched by the poll thread
+        self.live_queue = queue.Queue()
+        self.poll_thread = None
+        self.tracker = None
+        self.active = False
+        self.ticking = False
+        self.next_poll = 0.0
+        self.rows = {}
+        self.shift_names = ()
+
+    def on_show(self):
+        self.active = True
+        self.next_poll = 0.0
+        if not self.ticking:
+            self.ticking = True
+            self.tick()
+
+    def on_hide(self):
+        self.active = False
+
+    def tick(self):
+        """Main-thread loop: apply finished polls and start the next one when it is due"""
+        try:
+            kind, payload = self.live_queue.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            self.poll_thread = None
+            if kind == "rows":
+                self.apply_rows(*payload)
+            else:
+                self.summary_label.config(text=f"Could not read punches: {payload}")
+            self.next_poll = time.monotonic() + load_config().get("live_refresh_seconds", 5)
+
+        if not self.active and self.poll_thread is None:
+            self.ticking = False
+            return
+        if self.active and self.poll_thread is None and time.monotonic() >= self.next_poll:
+            self.poll_thread = threading.Thread(target=self.run_poll, daemon=True)
+            self.poll_thread.start()
+        self.after(200, self.tick)
+
+    def run_poll(self):
+        """Poll thread: reads new punches and posts the changed rows to live_queue"""
+        try:
+            attendance, _ = load_report_modules()
+            import live_attendance
+
+            db_path = attendance.load_config()["db_path"]
+            if self.tracker is None or self.tracker.db_path != db_path:
+                self.tracker = live_attendance.LiveAttendance(db_path)
+            now = datetime.datetime.now()
+            reset, rows = self.tracker.poll(now)
+            self.live_queue.put(("rows", (reset, rows, self.tracker.shift_names(),
+                                          self.tracker.current_shift_name(now))))
+        except Exception as e:
+            self.live_queue.put(("error", e))
+
+    def apply_rows(self, reset, rows, shift_names, current_shift):
+        if reset or shift_names != self.shift_names:
+            self.shift_names = shift_names
+            columns = ("name", "department") + tuple(f"shift{i}" for i in range(len(shift_names))) + ("last",)
+            self.table.delete(*self.table.get_children())
+            self.table.configure(columns=columns)
+            for column, heading, width in zip(columns, ("Name", "Department") + shift_names + ("Last Punch",),
+                                              (180, 120) + (90,) * len(shift_names) + (80,)):
+                self.table.heading(column, text=heading)
+                self.table.column(column, width=width, anchor="w" if column in ("name", "department") else "center")
+            self.rows = {}
+
+        # Only the changed employees are touched
+        for emp_id, name, dept_name, statuses, last_punch in rows:
+            values = (name, dept_name, *statuses, last_punch)
+            if emp_id in self.rows:
+                self.table.item(emp_id, values=values)
+            else:
+                self.table.insert("", tk.END, iid=emp_id, values=values)
+            self.rows[emp_id] = statuses
+
+        shift_text = f"Current shift: {current_shift}" if current_shift else "Between shifts"
+        if current_shift in shift_names:
+            shift_index = shift_names.index(current_shift)
+            clocked_in = sum(1 for statuses in self.rows.values() if statuses[shift_index] != "—")
+            shift_text += f" - {clocked_in} of {len(self.rows)} clocked in"
+        self.summary_label.config(text=f"{shift_text}    Updated {datetime.datetime.now():%H:%M:%S}")
+
+
 if __name__ == "__main__":
+    # Required for report worker processes in the frozen executable
+    multiprocessing.freeze_support()
     try:
         app = Application()
         app.mainloop()
@@ -1,16 +1,22 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# A one-folder build: a one-file build unpacks itself into a temp folder on every launch.
+# UPX stays off, since UPX-packed DLLs are decompressed again on every start.
+# The "numpy" engine is optional and falls back to "python" without NumPy, so NumPy and the
+# attendance_numpy module are left out unless the build runs with BIOTIME_WITH_NUMPY=1.
+with_numpy = os.environ.get("BIOTIME_WITH_NUMPY") == "1"
 
 a = Analysis(
     ['main_app.py'],
     pathex=[],
     binaries=[],
     datas=[('config.json', '.'), ('app_icon.ico', '.')],
-    hiddenimports=[],
+    hiddenimports=['attendance_numpy'] if with_numpy else [],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=[] if with_numpy else ['numpy', 'attendance_numpy'],
     noarchive=False,
     optimize=0,
 )
@@ -19,16 +25,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main_app',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -37,3 +40,12 @@ exe = EXE(
     entitlements_file=None,
     icon=['app_icon.ico'],
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main_app',
+)
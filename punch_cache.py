@@ -0,0 +1,129 @@
+import argparse
+import os
+import sqlite3
+
+import timenet_db
+
+default_cache_file = "punch_cache.db"
+
+
+# ===============================================================
+# CACHE SCHEMA
+# ===============================================================
+
+# The cached table keeps the source name so the report query resolves att_punches here
+# and hr_employee / hr_department in the attached source database
+cache_schema = """
+    CREATE TABLE IF NOT EXISTS att_punches (
+        id INTEGER PRIMARY KEY,
+        employee_id INTEGER NOT NULL,
+        punch_time TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_cache_punches_employee_punch_time ON att_punches (employee_id, punch_time);
+    CREATE TABLE IF NOT EXISTS cache_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM cache_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO cache_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+# ===============================================================
+# SYNCHRONISATION
+# ===============================================================
+
+# Bring the cache up to date with the source database using the att_punches id high-water mark
+def sync_punch_cache(conn, db_path, rebuild=False):
+    """
+    conn must have the source database attached as "source".
+    Punches with an id above the stored high-water mark are copied in; the cache is rebuilt
+    from scratch when asked to, when it was filled from another database, or when the
+    source's ids went backwards (e.g. a restored backup).
+    Returns: (number of punches copied, high-water mark)
+    """
+    source_path = os.path.abspath(db_path)
+    high_water_mark = int(_get_meta(conn, "high_water_mark") or 0)
+    source_max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM source.att_punches").fetchone()[0]
+
+    if rebuild or _get_meta(conn, "source_path") != source_path or source_max_id < high_water_mark:
+        conn.execute("DELETE FROM att_punches")
+        high_water_mark = 0
+
+    copied = conn.execute("""
+        INSERT OR REPLACE INTO main.att_punches (id, employee_id, punch_time)
+        SELECT id, employee_id, punch_time FROM source.att_punches WHERE id > ?
+    """, (high_water_mark,)).rowcount
+
+    _set_meta(conn, "source_path", source_path)
+    _set_meta(conn, "high_water_mark", max(high_water_mark, source_max_id))
+    conn.commit()
+    return copied, max(high_water_mark, source_max_id)
+
+
+# Open the cache with the source database attached, syncing new punches first
+def connect_cached(db_path, cache_path, rebuild=False):
+    """
+    Returns: a connection on which the report query reads punches from the cache and
+    employees and departments from the source database, attached read-only
+    """
+    if not os.path.exists(db_path):
+        raise sqlite3.OperationalError(f"unable to open database file: {db_path}")
+
+    conn = sqlite3.connect(cache_path, uri=True)
+    try:
+        conn.executescript(cache_schema)
+        conn.execute("ATTACH DATABASE ? AS source", (timenet_db.readonly_uri(db_path),))
+        timenet_db.apply_read_pragmas(conn, "source")
+        copied, high_water_mark = sync_punch_cache(conn, db_path, rebuild=rebuild)
+        print(f"Punch cache synced: {copied} new punches (high-water mark {high_water_mark})")
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+# Resolve the cache location, defaulting to a file next to config.json
+def cache_path_for(config, config_file):
+    cache_file = config.get("punch_cache_path") or default_cache_file
+    if os.path.isabs(cache_file):
+        return cache_file
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), cache_file)
+
+
+# Drop every cached punch and copy the full history again
+def rebuild_cache(db_path, cache_path):
+    conn = connect_cached(db_path, cache_path, rebuild=True)
+    conn.close()
+
+
+# ===============================================================
+# COMMAND LINE
+# ===============================================================
+
+def main(argv=None):
+    import attendance
+
+    parser = argparse.ArgumentParser(description="Sync or rebuild the local punch cache")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the cache and copy every punch again")
+    args = parser.parse_args(argv)
+
+    config = attendance.load_config()
+    try:
+        conn = connect_cached(config["db_path"], cache_path_for(config, attendance.config_file), rebuild=args.rebuild)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+
+# Fingerprints of the reports written to a report directory, kept in that directory
+fingerprint_index_file = "report_fingerprints.json"
+
+# Most recent fingerprints kept in the index; older entries are dropped
+max_index_entries = 100
+
+# Part of every fingerprint; bump it whenever the report contents change, so files written by an
+# older version are never served again
+report_format_version = 1
+
+# config.json keys that change what a report contains. Shifts are fingerprinted as compiled; the
+# other keys (query mode, caches, workers, prefetch, timing, reuse itself) only change how a
+# report is produced, so changing them keeps earlier reports reusable
+report_config_keys = ("db_path", "branches", "per_branch_sheets", "per_department_workbooks",
+                      "department_salaries")
+
+# Cheap reads that change whenever the data behind a report changes. Punches are only read in the
+# report's own [start, end) range: added or deleted punches move the count and id, and the sums move
+# when a punch is edited in place, to another time or another employee. The range is still read
+# with a full scan of att_punches, unless ANALYZE has run, after which SQLite may skip-scan the
+# (employee_id, punch_time) index instead. The roster tables are small enough to hash
+# whole. PRAGMA data_version is not used since it only compares changes seen by one connection,
+# and each report opens its own.
+punch_marker_query = """
+    SELECT COUNT(*), MAX(id), TOTAL(strftime('%s', punch_time)),
+           TOTAL(employee_id * (strftime('%s', punch_time) % 86400))
+    FROM att_punches
+    WHERE punch_time >= ? AND punch_time < ?
+"""
+roster_marker_queries = (
+    "SELECT id, emp_firstname, emp_lastname, department_id, emp_privilege, emp_active "
+    "FROM hr_employee ORDER BY id",
+    "SELECT id, dept_name FROM hr_department ORDER BY id",
+)
+
+
+# ===============================================================
+# FINGERPRINTS
+# ===============================================================
+
+# Hash of the punch and roster data a report reads, see punch_marker_query
+def database_marker(conn, range_start, range_end):
+    """range_start and range_end are the punch_time bounds of the report query"""
+    digest = hashlib.sha256()
+    queries = [(punch_marker_query, (range_start, range_end))] + [(query, ()) for query in roster_marker_queries]
+    for query, params in queries:
+        for row in conn.execute(query, params):
+            digest.update(repr(row).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Fingerprint of everything a report's contents depend on
+def report_fingerprint(config, start_date, end_date, shift_rules, engine, writer, db_marker):
+    """
+    shift_rules is (names, windows, table) from attendance.compile_shifts; db_marker comes from
+    database_marker. Returns: a hex digest
+    """
+    names, windows, _ = shift_rules
+    inputs = {
+        "version": report_format_version,
+        "start_date": start_date,
+        "end_date": end_date,
+        "config": report_config(config),
+        "shifts": [names, windows],
+        "engine": engine,
+        "writer": writer,
+        "database": db_marker,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# The part of config that a report's contents depend on, see report_config_keys
+def report_config(config):
+    """A branch's own punch cache does not change the report, so only its name and db_path are kept"""
+    result = {key: config.get(key) for key in report_config_keys}
+    result["branches"] = [[branch.get("name"), branch.get("db_path")] for branch in config.get("branches") or []]
+    return result
+
+
+# ===============================================================
+# FINGERPRINT INDEX
+# ===============================================================
+
+def _index_path(report_directory):
+    return os.path.join(report_directory, fingerprint_index_file)
+
+
+# Read the index of a report directory; a missing or damaged index is treated as empty
+def load_index(report_directory):
+    try:
+        with open(_index_path(report_directory), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def _save_index(report_directory, index):
+    path = _index_path(report_directory)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4)
+    os.replace(temp_path, path)
+
+
+# (mtime_ns, size) of a file, or None if it is missing
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# Look up a fingerprint whose files are all still exactly as they were written
+def find_report(report_directory, fingerprint):
+    """
+    A report edited, moved or deleted since it was written is not served.
+    Returns: {"path": report path, "departments": {dept_name: path}} or None
+    """
+    entry = load_index(report_directory).get(fingerprint)
+    if not entry:
+        return None
+    for path, signature in entry.get("files", {}).items():
+        if _file_signature(path) != signature:
+            return None
+    return entry
+
+
+# Remember the files written for a fingerprint
+def record_report(report_directory, fingerprint, full_path, department_paths=None):
+    """department_paths is {dept_name: path} for per-department workbooks written alongside"""
+    department_paths = department_paths or {}
+    paths = [full_path] + list(department_paths.values())
+    index = load_index(report_directory)
+    index.pop(fingerprint, None)
+    index[fingerprint] = {
+        "path": full_path,
+        "departments": department_paths,
+        "files": {path: _file_signature(path) for path in paths},
+    }
+    while len(index) > max_index_entries:
+        del index[next(iter(index))]
+    try:
+        _save_index(report_directory, index)
+    except OSError as e:
+        print(f"Could not save report fingerprints: {e}")
+
+
+# Copy a found report to the requested paths, unless it is already there
+def copy_report(entry, full_path, department_paths=None):
+    """
+    department_paths maps each department in the entry to its requested path.
+    Returns: full_path
+    """
+    copies = [(entry["path"], full_path)]
+    copies += [(path, department_paths[dept_name]) for dept_name, path in entry["departments"].items()
+               if department_paths and dept_name in department_paths]
+    for source, destination in copies:
+        if os.path.abspath(source) != os.path.abspath(destination):
+            shutil.copyfile(source, destination)
+    return full_path
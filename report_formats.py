@@ -0,0 +1,257 @@
+import csv
+import json
+import os
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+# ===============================================================
+# RAW SPREADSHEETML (.xlsx) WRITER
+# ===============================================================
+
+main_namespace = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+relationship_namespace = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+package_relationship_namespace = "http://schemas.openxmlformats.org/package/2006/relationships"
+xml_declaration = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Fonts, fills and borders matching the openpyxl styles in attendance.py
+styles_xml = xml_declaration + f"""<styleSheet xmlns="{main_namespace}">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="#,##0.0"/></numFmts>
+<fonts count="3">
+<font><sz val="11"/><color theme="1"/><name val="Calibri"/><family val="2"/><scheme val="minor"/></font>
+<font><b val="1"/></font>
+<font><b val="1"/><sz val="20"/></font>
+</fonts>
+<fills count="4">
+<fill><patternFill/></fill>
+<fill><patternFill patternType="gray125"/></fill>
+<fill><patternFill patternType="solid"><fgColor rgb="00D3D3D3"/><bgColor rgb="00D3D3D3"/></patternFill></fill>
+<fill><patternFill patternType="solid"><fgColor rgb="0081A8FC"/><bgColor rgb="0081A8FC"/></patternFill></fill>
+</fills>
+<borders count="2">
+<border><left/><right/><top/><bottom/><diagonal/></border>
+<border><left/><right/><top style="thin"/><bottom style="thin"/><diagonal/></border>
+</borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="{{count}}">
+{{xfs}}
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+# Cell formats by attendance.cell_styles name: (numFmtId, fontId, fillId, borderId, alignment attributes)
+cell_formats = {
+    None: (0, 0, 0, 0, None),
+    "header": (0, 1, 2, 1, 'horizontal="center" vertical="center"'),
+    "cell": (0, 0, 0, 1, None),
+    "money": (4, 0, 0, 1, None),
+    "days": (164, 0, 0, 1, None),
+    "attendance": (164, 0, 3, 1, None),
+    "title": (0, 2, 0, 0, 'horizontal="center"'),
+    "legend": (0, 1, 0, 0, 'horizontal="center"'),
+    "daily_header": (0, 1, 2, 1, 'horizontal="center"'),
+    "daily_id": (0, 0, 0, 1, 'horizontal="center" vertical="center"'),
+    "daily_name": (0, 0, 0, 1, 'horizontal="left" vertical="center"'),
+    "daily_status": (0, 0, 0, 1, 'horizontal="center" vertical="center" wrapText="1"'),
+}
+style_index = {name: index for index, name in enumerate(cell_formats)}
+
+
+def _xf_xml(num_fmt_id, font_id, fill_id, border_id, alignment):
+    applied = "".join(f' {flag}="1"' for flag, used in (("applyNumberFormat", num_fmt_id),
+                                                          ("applyFont", font_id),
+                                                          ("applyFill", fill_id),
+                                                          ("applyBorder", border_id),
+                                                          ("applyAlignment", alignment)) if used)
+    xf = f'<xf numFmtId="{num_fmt_id}" fontId="{font_id}" fillId="{fill_id}" borderId="{border_id}" xfId="0"{applied}'
+    if alignment:
+        return f"{xf}><alignment {alignment}/></xf>"
+    return f"{xf}/>"
+
+
+def _styles_part():
+    xfs = "\n".join(_xf_xml(*cell_format) for cell_format in cell_formats.values())
+    return styles_xml.replace("{count}", str(len(cell_formats))).replace("{xfs}", xfs)
+
+
+# Convert a 1-based column number to its letter, e.g. 28 -> "AB"
+def column_letter(col_num):
+    letters = ""
+    while col_num:
+        col_num, remainder = divmod(col_num - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+# Split a cell reference such as "B2" into (column number, row number)
+def _cell_coordinates(reference):
+    letters = "".join(char for char in reference if char.isalpha())
+    col_num = 0
+    for char in letters:
+        col_num = col_num * 26 + ord(char.upper()) - 64
+    return col_num, int(reference[len(letters):])
+
+
+def _cell_xml(reference, value, style):
+    style_attribute = f' s="{style_index[style]}"' if style else ""
+    if value is None or value == "":
+        return f'<c r="{reference}"{style_attribute}/>'
+    if isinstance(value, bool):
+        return f'<c r="{reference}"{style_attribute} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"{style_attribute} t="n"><v>{value!r}</v></c>'
+    if value.startswith("="):
+        return f'<c r="{reference}"{style_attribute}><f>{escape(value[1:])}</f><v></v></c>'
+    return f'<c r="{reference}"{style_attribute} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+
+
+def _sheet_view_xml(freeze_panes, selected):
+    selected_attribute = ' tabSelected="1"' if selected else ""
+    if not freeze_panes:
+        return f'<sheetViews><sheetView{selected_attribute} workbookViewId="0">' \
+               f'<selection activeCell="A1" sqref="A1"/></sheetView></sheetViews>'
+
+    col_num, row_num = _cell_coordinates(freeze_panes)
+    split = ""
+    if col_num > 1:
+        split += f' xSplit="{col_num - 1}"'
+    if row_num > 1:
+        split += f' ySplit="{row_num - 1}"'
+    active_pane = {(True, True): "bottomRight", (True, False): "topRight",
+                   (False, True): "bottomLeft"}.get((col_num > 1, row_num > 1), "bottomRight")
+    return (f'<sheetViews><sheetView{selected_attribute} workbookViewId="0">'
+            f'<pane{split} topLeftCell="{freeze_panes}" activePane="{active_pane}" state="frozen"/>'
+            f'<selection pane="{active_pane}" activeCell="{freeze_panes}" sqref="{freeze_panes}"/>'
+            f'</sheetView></sheetViews>')
+
+
+# Stream one worksheet part, row by row
+def _write_sheet(stream, sheet, selected):
+    def write(text):
+        stream.write(text.encode("utf-8"))
+
+    write(xml_declaration)
+    write(f'<worksheet xmlns="{main_namespace}" xmlns:r="{relationship_namespace}">')
+    write(_sheet_view_xml(sheet["freeze_panes"], selected))
+    write('<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>')
+
+    if sheet["column_widths"]:
+        write("<cols>")
+        for col_num, width in sorted(sheet["column_widths"].items()):
+            write(f'<col min="{col_num}" max="{col_num}" width="{width}" customWidth="1"/>')
+        write("</cols>")
+
+    write("<sheetData>")
+    row_heights = sheet["row_heights"]
+    for row_num, row in enumerate(sheet["rows"], 1):
+        height = row_heights.get(row_num)
+        height_attributes = f' ht="{height}" customHeight="1"' if height is not None else ""
+        cells = "".join(_cell_xml(f"{column_letter(col_num)}{row_num}", value, style)
+                        for col_num, (value, style) in enumerate(row, 1) if value is not None or style)
+        write(f'<row r="{row_num}"{height_attributes}>{cells}</row>')
+    write("</sheetData>")
+
+    if sheet["merged_cells"]:
+        write(f'<mergeCells count="{len(sheet["merged_cells"])}">')
+        for cell_range in sheet["merged_cells"]:
+            write(f'<mergeCell ref="{cell_range}"/>')
+        write("</mergeCells>")
+
+    write('<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>')
+    write("</worksheet>")
+
+
+# Write sheets described by attendance.report_layout into a new .xlsx file
+def write_xlsx(path, sheets):
+    """
+    Each sheet part is streamed into the zip as its rows are generated, so only one row
+    is held in memory at a time. A partially written file is removed if writing fails.
+    """
+    sheet_names = []
+    try:
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for sheet_number, sheet in enumerate(sheets, 1):
+                sheet_names.append(sheet["title"])
+                with archive.open(f"xl/worksheets/sheet{sheet_number}.xml", "w") as stream:
+                    _write_sheet(stream, sheet, selected=sheet_number == 1)
+
+            sheet_overrides = "".join(
+                f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for number in range(1, len(sheet_names) + 1))
+            archive.writestr("[Content_Types].xml", xml_declaration +
+                             '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                             '<Default Extension="rels" '
+                             'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                             '<Default Extension="xml" ContentType="application/xml"/>'
+                             '<Override PartName="/xl/workbook.xml" '
+                             'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                             '<Override PartName="/xl/styles.xml" '
+                             'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                             f'{sheet_overrides}</Types>')
+            archive.writestr("_rels/.rels", xml_declaration +
+                             f'<Relationships xmlns="{package_relationship_namespace}">'
+                             f'<Relationship Id="rId1" Type="{relationship_namespace}/officeDocument" '
+                             'Target="xl/workbook.xml"/></Relationships>')
+
+            sheet_entries = "".join(f'<sheet name={quoteattr(name)} sheetId="{number}" r:id="rId{number}"/>'
+                                    for number, name in enumerate(sheet_names, 1))
+            archive.writestr("xl/workbook.xml", xml_declaration +
+                             f'<workbook xmlns="{main_namespace}" xmlns:r="{relationship_namespace}">'
+                             '<bookViews><workbookView activeTab="0"/></bookViews>'
+                             f'<sheets>{sheet_entries}</sheets></workbook>')
+
+            sheet_relationships = "".join(
+                f'<Relationship Id="rId{number}" Type="{relationship_namespace}/worksheet" '
+                f'Target="worksheets/sheet{number}.xml"/>' for number in range(1, len(sheet_names) + 1))
+            archive.writestr("xl/_rels/workbook.xml.rels", xml_declaration +
+                             f'<Relationships xmlns="{package_relationship_namespace}">{sheet_relationships}'
+                             f'<Relationship Id="rId{len(sheet_names) + 1}" Type="{relationship_namespace}/styles" '
+                             'Target="styles.xml"/></Relationships>')
+            archive.writestr("xl/styles.xml", _styles_part())
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+# ===============================================================
+# PAYROLL EXPORTS
+# ===============================================================
+
+# CSV columns and the payroll record keys they come from
+csv_columns = [
+    ("No.", "no"),
+    ("Employee ID", "employee_id"),
+    ("Last Name", "last_name"),
+    ("First Name", "first_name"),
+    ("Position", "position"),
+    ("Daily", "daily"),
+    ("Monthly", "monthly"),
+    ("Late Minutes", "late_minutes"),
+    ("Absences", "absences"),
+    ("Attendance", "attendance"),
+    ("Gross", "gross"),
+    ("Late Deduction", "late_deduction"),
+    ("Absence Deduction", "absence_deduction"),
+    ("Net Pay", "net_pay"),
+]
+
+# Added to csv_columns when the report combines several branch databases
+branch_csv_column = ("Branch", "branch")
+
+
+# One row per employee with the "Attendance" sheet values, for payroll imports
+def write_csv(path, records, columns=None):
+    columns = columns or csv_columns
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([header for header, _ in columns])
+        for record in records:
+            writer.writerow([record[key] for _, key in columns])
+
+
+# One JSON object per line per employee, including the per-date AM/PM statuses
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,129 @@
+import threading
+
+# Ranges longer than this are not prefetched
+default_prefetch_max_days = 62
+
+# A prefetched result with more (employee, day) cells than this is dropped instead of kept
+default_prefetch_max_cells = 250000
+
+
+# ===============================================================
+# PREFETCHED ATTENDANCE
+# ===============================================================
+
+# Classified attendance for one range, loaded before the report was asked for
+class PrefetchedAttendance:
+    """
+    fingerprint is attendance.report_fingerprint with writer None, taken before the punches were
+    read; generate_report only uses employee_attendance while that fingerprint still matches.
+    """
+
+    def __init__(self, start_date, end_date, fingerprint, employee_attendance):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.fingerprint = fingerprint
+        self.employee_attendance = employee_attendance
+
+
+# Load and classify a range as generate_report would, in this process
+def prefetch_attendance(start_date, end_date, cancel_event=None):
+    """
+    Raises attendance.ReportCancelled when cancel_event is set
+    Returns: a PrefetchedAttendance
+    """
+    import attendance
+
+    config = attendance.load_config()
+    engine = config.get("engine", "python")
+    db_marker = attendance.database_marker(config, start_date, end_date)
+    fingerprint = attendance.report_fingerprint(config, start_date, end_date, engine, None, db_marker)
+    employee_attendance = attendance.load_report_attendance(config, start_date, end_date, engine,
+                                                            cancel_event=cancel_event)
+    return PrefetchedAttendance(start_date, end_date, fingerprint, employee_attendance)
+
+
+# ===============================================================
+# BACKGROUND PREFETCHER
+# ===============================================================
+
+# Prefetches the latest requested range on a background thread, keeping at most one result
+class ReportPrefetcher:
+    """
+    Requesting another range cancels the running prefetch and drops any result held for an older
+    range, so memory is bounded by one range of at most max_days days and max_cells
+    (employee, day) cells. Safe to call from the Tk thread: no method waits except take.
+    """
+
+    def __init__(self, max_days=default_prefetch_max_days, max_cells=default_prefetch_max_cells):
+        self.max_days = max_days
+        self.max_cells = max_cells
+        self._lock = threading.Lock()
+        self._job = None
+        self._result = None
+
+    # Start prefetching start_date..end_date unless it is already prefetched or being prefetched
+    def request(self, start_date, end_date, num_days):
+        date_range = (start_date, end_date)
+        with self._lock:
+            if self._job is not None and self._job["range"] == date_range:
+                return
+            if self._result is not None and (self._result.start_date, self._result.end_date) == date_range:
+                return
+            self._cancel_locked()
+            if num_days > self.max_days:
+                return
+
+            job = {"range": date_range, "num_days": num_days, "cancel_event": threading.Event(),
+                   "done": threading.Event()}
+            job["thread"] = threading.Thread(target=self._run, args=(job,), daemon=True)
+            self._job = job
+        job["thread"].start()
+
+    def _run(self, job):
+        start_date, end_date = job["range"]
+        result = None
+        try:
+            result = prefetch_attendance(start_date, end_date, job["cancel_event"])
+        except Exception as e:
+            # Cancellation, or an error the report itself will show if it happens again
+            if not job["cancel_event"].is_set():
+                print(f"Prefetch of {start_date} to {end_date} failed: {e}")
+        finally:
+            with self._lock:
+                if self._job is job:
+                    self._job = None
+                    if result is not None and len(result.employee_attendance) * job["num_days"] <= self.max_cells:
+                        self._result = result
+                job["done"].set()
+
+    def _cancel_locked(self):
+        if self._job is not None:
+            self._job["cancel_event"].set()
+            self._job = None
+        self._result = None
+
+    # Stop any running prefetch and drop the held result
+    def cancel(self):
+        with self._lock:
+            self._cancel_locked()
+
+    # Hand over the prefetched range, waiting for it if it is still loading
+    def take(self, start_date, end_date, cancel_event=None):
+        """
+        Call from a worker thread, never the Tk thread; setting cancel_event stops the wait.
+        Returns: the PrefetchedAttendance for exactly this range, or None (also when cancelled); the
+        prefetcher lets go of it
+        """
+        with self._lock:
+            job = self._job if self._job is not None and self._job["range"] == (start_date, end_date) else None
+        if job is not None:
+            while not job["done"].wait(0.1):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+
+        with self._lock:
+            result = self._result
+            self._result = None
+        if result is not None and (result.start_date, result.end_date) == (start_date, end_date):
+            return result
+        return None
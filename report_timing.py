@@ -0,0 +1,176 @@
+import cProfile
+import datetime
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+default_timing_log = "report_timings.jsonl"
+
+# Stages timed during a report, in the order they run; "fetch" is the time spent reading
+# rows inside the classify stage and is not counted in "classify"; "payroll" runs after classifying.
+# "fingerprint" checks whether an unchanged earlier report can be served instead, see report_cache
+timing_stages = ("fingerprint", "query", "fetch", "classify", "payroll", "write", "save")
+
+
+# ===============================================================
+# STAGE TIMER
+# ===============================================================
+
+# Wall time, row counts and peak traced memory for each stage of one report run
+class ReportTimer:
+    """
+    Exactly one stage is running at a time: start() switches stages and section() runs a
+    nested stage, returning to the previous one afterwards. With trace_memory, tracemalloc
+    records the peak Python memory seen while each stage was running (this slows the run).
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.total_seconds = 0.0
+        self._current = None
+        self._stage_started = None
+        self._run_started = None
+        self._started_tracing = False
+
+    def begin(self):
+        self._run_started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def finish(self):
+        self._switch(None)
+        if self._run_started is not None:
+            self.total_seconds = time.perf_counter() - self._run_started
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _stage(self, stage):
+        return self.stages.setdefault(stage, {"seconds": 0.0, "rows": 0, "peak_bytes": None})
+
+    def _switch(self, stage):
+        now = time.perf_counter()
+        if self._current is not None:
+            record = self._stage(self._current)
+            record["seconds"] += now - self._stage_started
+            if tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                record["peak_bytes"] = max(record["peak_bytes"] or 0, peak)
+        if stage is not None:
+            self._stage(stage)
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+        self._current = stage
+        self._stage_started = now
+
+    # Stop timing the running stage and start timing stage
+    def start(self, stage):
+        self._switch(stage)
+
+    # Time a nested stage, then resume the stage that was running
+    @contextmanager
+    def section(self, stage):
+        previous = self._current
+        self._switch(stage)
+        try:
+            yield
+        finally:
+            self._switch(previous)
+
+    def count(self, stage, rows):
+        self._stage(stage)["rows"] += rows
+
+    # Wrap a report progress callback so every stage change also switches the timed stage
+    def progress_callback(self, progress=None):
+        def timed_progress(stage):
+            self.start(stage)
+            if progress:
+                progress(stage)
+        return timed_progress
+
+    # Yield from iterable, timing each step as stage
+    def timed_iter(self, iterable, stage):
+        iterator = iter(iterable)
+        while True:
+            with self.section(stage):
+                item = next(iterator, _exhausted)
+            if item is _exhausted:
+                return
+            yield item
+
+    def summary(self):
+        """Returns: {stage: {"seconds", "rows", "peak_mb"}} in timing_stages order"""
+        ordered = [stage for stage in timing_stages if stage in self.stages]
+        ordered += [stage for stage in self.stages if stage not in timing_stages]
+        return {
+            stage: {
+                "seconds": round(self.stages[stage]["seconds"], 4),
+                "rows": self.stages[stage]["rows"],
+                "peak_mb": None if self.stages[stage]["peak_bytes"] is None
+                else round(self.stages[stage]["peak_bytes"] / 1048576, 1)
+            }
+            for stage in ordered
+        }
+
+    # One line per stage for the GUI, e.g. "Query: 0.12s"
+    def summary_text(self):
+        lines = []
+        for stage, record in self.summary().items():
+            line = f"{stage.capitalize()}: {record['seconds']:.2f}s"
+            if record["rows"]:
+                line += f", {record['rows']} rows"
+            if record["peak_mb"] is not None:
+                line += f", peak {record['peak_mb']} MB"
+            lines.append(line)
+        lines.append(f"Total: {self.total_seconds:.2f}s")
+        return "\n".join(lines)
+
+
+_exhausted = object()
+
+
+# ===============================================================
+# TIMING LOG AND PROFILING
+# ===============================================================
+
+# Resolve the timing log location, defaulting to a file next to config.json; "" disables the log
+def timing_log_path(config, config_file):
+    log_file = config.get("timing_log", default_timing_log)
+    if not log_file or os.path.isabs(log_file):
+        return log_file
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), log_file)
+
+
+# Append one JSON line describing a report run
+def write_timing_log(path, timer, status, **details):
+    if not path:
+        return
+    entry = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "status": status, **details,
+             "total_seconds": round(timer.total_seconds, 4), "stages": timer.summary()}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Could not write timing log: {e}")
+
+
+# Profile the enclosed block with cProfile and dump the stats to profile_path, if given
+@contextmanager
+def profiled(profile_path):
+    """The .prof file can be read with pstats or snakeviz; only the calling thread is profiled"""
+    if not profile_path:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        print(f"Profile written to {profile_path}")
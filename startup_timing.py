@@ -0,0 +1,193 @@
+import datetime
+import json
+import os
+import sys
+import time
+
+# perf_counter value that startup times are measured from; install() moves it back to the process
+# creation time when that can be read, see startup_reference
+process_started = time.perf_counter()
+measured_from = "startup_timing import"
+
+startup_log_file = "startup_timings.jsonl"
+
+_enabled = False
+_events = []
+_module_seconds = {}
+
+
+# ===============================================================
+# IMPORT TIMING
+# ===============================================================
+
+# Wraps a module loader so executing the module's code is timed
+class _TimedLoader:
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            _module_seconds[module.__name__] = time.perf_counter() - started
+
+
+# Meta path finder that asks the remaining finders (including PyInstaller's) and times what they load
+class _TimedFinder:
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        for finder in sys.meta_path:
+            if isinstance(finder, _TimedFinder) or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+# Start recording import times, if asked for with --startup-report or BIOTIME_STARTUP_REPORT=1
+def install(argv=None):
+    """
+    Returns: True when startup timing is enabled
+    Module times are cumulative: a module's time includes the modules it imports first.
+    """
+    global _enabled
+    argv = sys.argv if argv is None else argv
+    if "--startup-report" in argv:
+        argv.remove("--startup-report")
+        _enabled = True
+    elif os.environ.get("BIOTIME_STARTUP_REPORT") == "1":
+        _enabled = True
+
+    if _enabled:
+        global process_started, measured_from
+        started_at, reference = startup_reference()
+        if started_at is not None:
+            process_started = time.perf_counter() - (time.time() - started_at)
+            measured_from = reference
+        sys.meta_path.insert(0, _TimedFinder())
+    return _enabled
+
+
+# Record a named point in startup, e.g. "window shown"
+def mark(event):
+    if _enabled:
+        _events.append((event, time.perf_counter() - process_started))
+
+
+# ===============================================================
+# PROCESS START
+# ===============================================================
+
+# FILETIME counts 100 ns ticks from 1601-01-01; this many seconds separate it from the Unix epoch
+filetime_epoch_offset = 11644473600
+process_query_limited_information = 0x1000
+
+
+# When startup began, as wall-clock seconds since the epoch
+def startup_reference():
+    """
+    The creation time of this process, so interpreter startup is included. A PyInstaller one-file
+    build runs the app in a child of the bootloader that unpacked it, so there the bootloader's own
+    creation time is used, which also counts the unpacking.
+    Returns: (seconds since the epoch, description), or (None, None) where neither can be read
+    """
+    own = process_info(os.getpid())
+    if own is None:
+        return None, None
+    if getattr(sys, "frozen", False):
+        parent = process_info(os.getppid())
+        if parent is not None and os.path.normcase(parent[1]) == os.path.normcase(own[1]):
+            return parent[0], "one-file bootloader start"
+    return own[0], "process start"
+
+
+# Creation time and executable path of a process
+def process_info(pid):
+    """Returns: (seconds since the epoch, executable path), or None on systems other than Windows and Linux"""
+    try:
+        if os.name == "nt":
+            return _windows_process_info(pid)
+        return _linux_process_info(pid)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _windows_process_info(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+    if not handle:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        creation, exited, kernel, user = (wintypes.FILETIME() for _ in range(4))
+        if not kernel32.GetProcessTimes(wintypes.HANDLE(handle), ctypes.byref(creation), ctypes.byref(exited),
+                                        ctypes.byref(kernel), ctypes.byref(user)):
+            raise ctypes.WinError(ctypes.get_last_error())
+        path = ctypes.create_unicode_buffer(32768)
+        size = wintypes.DWORD(len(path))
+        if not kernel32.QueryFullProcessImageNameW(wintypes.HANDLE(handle), 0, path, ctypes.byref(size)):
+            raise ctypes.WinError(ctypes.get_last_error())
+    finally:
+        kernel32.CloseHandle(wintypes.HANDLE(handle))
+    ticks = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+    return ticks / 1e7 - filetime_epoch_offset, path.value
+
+
+def _linux_process_info(pid):
+    # Field 22 of /proc/<pid>/stat is the start time in clock ticks after boot; the command name
+    # before it is in parentheses and may contain spaces
+    with open(f"/proc/{pid}/stat", "r") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # Seconds since boot from /proc/uptime; the btime line of /proc/stat is only whole seconds
+    with open("/proc/uptime", "r") as f:
+        uptime = float(f.read().split()[0])
+    started_at = time.time() - (uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    return started_at, os.readlink(f"/proc/{pid}/exe")
+
+
+# ===============================================================
+# REPORT
+# ===============================================================
+
+# Write the startup timings to the log and print a short summary
+def write_report(log_dir, top=15):
+    """Does nothing unless install() enabled timing"""
+    if not _enabled:
+        return
+
+    slowest = sorted(_module_seconds.items(), key=lambda item: item[1], reverse=True)[:top]
+    entry = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "frozen": bool(getattr(sys, "frozen", False)),
+        "python": sys.version.split()[0],
+        "measured_from": measured_from,
+        "events": {event: round(seconds, 4) for event, seconds in _events},
+        "modules_loaded": len(_module_seconds),
+        "slowest_imports": {name: round(seconds, 4) for name, seconds in slowest},
+    }
+
+    print(f"Startup timings (seconds since {measured_from}):")
+    for event, seconds in _events:
+        print(f"    {event:<28} {seconds:7.3f}")
+    print(f"Slowest imports of {len(_module_seconds)} modules (cumulative):")
+    for name, seconds in slowest:
+        print(f"    {name:<28} {seconds:7.3f}")
+
+    try:
+        with open(os.path.join(log_dir, startup_log_file), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Could not write startup timings: {e}")
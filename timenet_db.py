@@ -0,0 +1,106 @@
+import os
+import random
+import sqlite3
+import time
+import urllib.parse
+
+# Read-tuned pragmas for report connections: a 64 MiB page cache and 256 MiB of memory-mapped I/O
+# per database, with temporary sort/index data kept in memory instead of temp files
+read_pragmas = {
+    "cache_size": -65536,
+    "mmap_size": 268435456,
+}
+connection_pragmas = {
+    "temp_store": "MEMORY",
+}
+
+# How long SQLite itself waits on a lock before our retry loop takes over
+busy_timeout_seconds = 1.0
+
+# Retries for "database is locked" / "database is busy", with exponential backoff between them
+lock_retries = 5
+lock_retry_delay = 0.25
+lock_retry_max_delay = 4.0
+
+
+# ===============================================================
+# READ-ONLY CONNECTIONS
+# ===============================================================
+
+# URI that opens a database file read-only, e.g. file:///C:/Program%20Files/.../TimeNet.db?mode=ro
+def readonly_uri(db_path):
+    return database_uri(db_path, "ro")
+
+
+# URI that opens an existing database file for writing; unlike a plain path, mode=rw never creates it
+def readwrite_uri(db_path):
+    return database_uri(db_path, "rw")
+
+
+# SQLite file: URI for a path that a plain sqlite3.connect would open, in the given mode
+def database_uri(db_path, mode):
+    """
+    The path is made absolute but not resolved, so mapped network drives stay as they are. UNC
+    paths get an empty authority (file:////server/share/TimeNet.db), since SQLite rejects any
+    other, and "?", "#" and "%" in the path are percent-encoded.
+    """
+    path = os.path.abspath(db_path).replace(os.sep, "/")
+    if not path.startswith("/"):
+        path = "/" + path
+    return "file://" + urllib.parse.quote(path, safe="/:") + "?mode=" + mode
+
+
+# Apply the read pragmas to one database of a connection, e.g. the attached "source"
+def apply_read_pragmas(conn, schema="main"):
+    for pragma, value in read_pragmas.items():
+        conn.execute(f"PRAGMA {schema}.{pragma} = {value}")
+    for pragma, value in connection_pragmas.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+# Open the ZKBio Time.Net database read-only, so a report can never write to or extend it
+def connect_readonly(db_path):
+    """
+    Raises sqlite3.OperationalError if the file does not exist (mode=ro never creates it)
+    """
+    conn = sqlite3.connect(readonly_uri(db_path), uri=True, timeout=busy_timeout_seconds)
+    try:
+        apply_read_pragmas(conn)
+        conn.execute("PRAGMA query_only = 1")
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+# True when the database uses write-ahead logging, where readers never block the writer
+def is_wal(conn, schema="main"):
+    return conn.execute(f"PRAGMA {schema}.journal_mode").fetchone()[0].lower() == "wal"
+
+
+# ===============================================================
+# LOCK RETRIES
+# ===============================================================
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+# Call func, retrying with exponential backoff and jitter while the database is locked
+def with_lock_retry(func, retries=None, delay=None):
+    """
+    Returns: func's result
+    Any other error, or a lock that outlasts every retry, is raised to the caller.
+    """
+    retries = lock_retries if retries is None else retries
+    delay = lock_retry_delay if delay is None else delay
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e) or attempt == retries:
+                raise
+            wait = min(delay * 2 ** attempt, lock_retry_max_delay) * random.uniform(0.5, 1.0)
+            print(f"Database is locked, retrying in {wait:.2f}s ({attempt + 1}/{retries})")
+            time.sleep(wait)